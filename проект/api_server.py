@@ -0,0 +1,323 @@
+import sys
+import json
+import queue
+import random
+import asyncio
+import hashlib
+import argparse
+import traceback
+from collections import OrderedDict
+from datetime import datetime
+from urllib.parse import urlsplit, parse_qs
+
+from rain2pedia import DatabaseManager, pick_item_of_the_day
+
+
+# локальный json api только для чтения поверх каталога предметов
+#
+#   GET /items?search=&rarity=&sort=name|rarity&limit=50&offset=0
+#   GET /items/<id>
+#   GET /rarities
+#   GET /item-of-the-day
+#   GET /loot?count=5&seed=<число>
+#
+# на каждый ответ выдается ETag, привязанный к версии каталога (seq журнала изменений),
+# повторный запрос с If-None-Match получает 304 без обращения к базе
+
+
+class ApiError(Exception):
+    # ошибка запроса, которая отдается клиенту с указанным http-статусом
+
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+        self.message = message
+
+
+class ConnectionPool:
+    # пул соединений sqlite только для чтения, соединения используются из потоков
+
+    def __init__(self, db_manager, size=4):
+        self.connections = queue.Queue()
+        for _ in range(size):
+            self.connections.put(db_manager.get_connection(read_only=True))
+        self.size = size
+
+    def run(self, func, *args):
+        # выполняет func(*args, conn) на свободном соединении
+        conn = self.connections.get()
+        try:
+            return func(*args, conn)
+        finally:
+            self.connections.put(conn)
+
+    def close(self):
+        for _ in range(self.size):
+            self.connections.get().close()
+
+
+class ResponseCache:
+    # lru-кэш готовых ответов, целиком сбрасывается при смене версии каталога
+
+    def __init__(self, max_size=1024):
+        self.max_size = max_size
+        self.version = None
+        self.entries = OrderedDict()
+
+    def get(self, key, version):
+        if version != self.version:
+            self.entries.clear()
+            self.version = version
+            return None
+        entry = self.entries.get(key)
+        if entry is not None:
+            self.entries.move_to_end(key)
+        return entry
+
+    def put(self, key, version, entry):
+        if version != self.version:
+            return  # каталог успел измениться, пока считался ответ
+        self.entries[key] = entry
+        if len(self.entries) > self.max_size:
+            self.entries.popitem(last=False)
+
+
+class CatalogServer:
+    # asyncio http-сервер; запросы к базе выполняются в потоках через пул соединений
+
+    STATUS_TEXT = {200: "OK", 304: "Not Modified", 400: "Bad Request", 404: "Not Found",
+                   405: "Method Not Allowed", 500: "Internal Server Error"}
+
+    MAX_PAGE_SIZE = 500
+    MAX_LOOT_COUNT = 100
+    MAX_SQLITE_INT = 2 ** 63 - 1  # большие числа sqlite3 не принимает (OverflowError)
+
+    def __init__(self, db_path="items.db", pool_size=4, cache_size=1024):
+        self.db_manager = DatabaseManager(db_path)  # заодно применяет миграции
+        for note in self.db_manager.migration_notes:
+            print(note, file=sys.stderr)
+        self.pool = ConnectionPool(self.db_manager, pool_size)
+        self.cache = ResponseCache(cache_size)
+        self.in_flight = {}  # (ключ, версия) -> future расчета ответа
+        self.ids_cache = (None, [])  # (версия, id всех предметов) для лута и предмета дня
+
+        self.db_manager.has_external_changes()  # запоминаем начальный data_version
+        self.version = self.db_manager.get_last_change_seq()
+
+    def refresh_version(self):
+        # дешевая проверка PRAGMA data_version, seq перечитывается только при изменениях
+        if self.db_manager.has_external_changes():
+            self.version = self.db_manager.get_last_change_seq()
+            self.db_manager.mark_synced()  # если чтение упало, проверка сработает и на следующем запросе
+        return self.version
+
+    @staticmethod
+    def item_to_dict(item):
+        return {"id": item.id, "name": item.name, "rarity": item.rarity,
+                "desc": item.desc, "effect": item.effect}
+
+    @classmethod
+    def get_int(cls, params, name, default, minimum=0, maximum=None):
+        # читает целый параметр запроса с проверкой границ (не больше 64-битного целого sqlite)
+        if maximum is None:
+            maximum = cls.MAX_SQLITE_INT
+        value = params.get(name, default)
+        try:
+            value = int(value)
+        except (TypeError, ValueError):
+            raise ApiError(400, f"параметр {name} должен быть целым числом")
+        if value < minimum or value > maximum:
+            raise ApiError(400, f"параметр {name} вне допустимого диапазона")
+        return value
+
+    def get_all_ids(self, version, conn):
+        # id всех предметов в порядке базы, кэшируются до смены версии
+        cached_version, ids = self.ids_cache
+        if cached_version != version:
+            ids = [row[0] for row in conn.execute("SELECT id FROM items ORDER BY id")]
+            self.ids_cache = (version, ids)
+        return ids
+
+    def handle_items(self, params, version, conn):
+        search_text = params.get("search", "")
+        rarity = params.get("rarity") or None
+        sort_by = params.get("sort", "name")
+        if sort_by not in ("name", "rarity"):
+            raise ApiError(400, "sort должен быть name или rarity")
+        limit = self.get_int(params, "limit", 50, 1, self.MAX_PAGE_SIZE)
+        offset = self.get_int(params, "offset", 0)
+
+        items = self.db_manager.query_items(search_text, rarity, sort_by, limit, offset, conn=conn)
+        total = self.db_manager.count_items(search_text, rarity, conn=conn)
+        return {"version": version, "total": total, "limit": limit, "offset": offset,
+                "items": [self.item_to_dict(item) for item in items]}
+
+    def handle_item(self, item_id, version, conn):
+        item = self.db_manager.get_item(self.get_int({"id": item_id}, "id", None), conn=conn)
+        if item is None:
+            raise ApiError(404, "предмет не найден")
+        return self.item_to_dict(item)
+
+    def handle_rarities(self, params, version, conn):
+        return {"version": version, "rarities": self.db_manager.get_rarities(conn=conn)}
+
+    def handle_item_of_the_day(self, params, version, conn):
+        # тот же выбор, что и в приложении: зависит только от даты и порядка предметов
+        today = datetime.now().date()
+        item_id = pick_item_of_the_day(self.get_all_ids(version, conn), today)
+        if item_id is None:
+            raise ApiError(404, "каталог пуст")
+        item = self.db_manager.get_item(item_id, conn=conn)
+        return {"date": today.isoformat(), "item": self.item_to_dict(item)}
+
+    def handle_loot(self, params, version, conn):
+        count = self.get_int(params, "count", 5, 1, self.MAX_LOOT_COUNT)
+        seed = params.get("seed")
+        ids = self.get_all_ids(version, conn)
+        rnd = random.Random(seed)
+        loot_ids = rnd.sample(ids, min(count, len(ids)))
+        loot = [self.db_manager.get_item(item_id, conn=conn) for item_id in loot_ids]
+        return {"seed": seed, "items": [self.item_to_dict(item) for item in loot if item is not None]}
+
+    def resolve(self, path, params):
+        # возвращает (обработчик, аргумент, можно ли кэшировать ответ)
+        if path == "/items":
+            return self.handle_items, params, True
+        if path.startswith("/items/"):
+            return self.handle_item, path[len("/items/"):], True
+        if path == "/rarities":
+            return self.handle_rarities, params, True
+        if path == "/item-of-the-day":
+            return self.handle_item_of_the_day, params, True
+        if path == "/loot":
+            # без сида каждый бросок новый, кэшировать нельзя
+            return self.handle_loot, params, "seed" in params
+        raise ApiError(404, "неизвестный адрес")
+
+    async def render(self, handler, argument, version):
+        # считает ответ в потоке пула, возвращает (тело, etag)
+        payload = await asyncio.to_thread(self.pool.run, handler, argument, version)
+        body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+        return body, f'"{version}-{hashlib.sha1(body).hexdigest()[:16]}"'
+
+    async def dispatch(self, method, target, headers):
+        # возвращает (статус, тело, дополнительные заголовки)
+        if method not in ("GET", "HEAD"):
+            raise ApiError(405, "поддерживаются только GET и HEAD")
+
+        url = urlsplit(target)
+        params = {name: values[-1] for name, values in parse_qs(url.query).items()}
+        handler, argument, cacheable = self.resolve(url.path.rstrip("/") or "/", params)
+
+        version = self.refresh_version()
+        # предмет дня меняется с датой даже без изменений каталога
+        key = (url.path, tuple(sorted(params.items())), datetime.now().date())
+
+        if not cacheable:
+            body, etag = await self.render(handler, argument, version)
+            return 200, body, {"Cache-Control": "no-store"}
+
+        entry = self.cache.get(key, version)
+        if entry is None:
+            # одинаковые одновременные промахи ждут один и тот же расчет
+            pending = self.in_flight.get((key, version))
+            if pending is None:
+                pending = asyncio.ensure_future(self.render(handler, argument, version))
+                self.in_flight[(key, version)] = pending
+                pending.add_done_callback(lambda _, k=(key, version): self.in_flight.pop(k, None))
+            entry = await asyncio.shield(pending)
+            self.cache.put(key, version, entry)
+
+        body, etag = entry
+        if headers.get("if-none-match") == etag:
+            return 304, b"", {"ETag": etag}
+        return 200, body, {"ETag": etag, "Cache-Control": "no-cache"}
+
+    async def handle_connection(self, reader, writer):
+        # обслуживает одно соединение, поддерживает keep-alive
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b"\r\n", b"\n", b""):
+                        break
+                    name, _, value = line.decode("latin-1").partition(":")
+                    headers[name.strip().lower()] = value.strip()
+
+                parts = request_line.decode("utf-8", "replace").split()
+                method = parts[0] if parts else ""
+                http_version = parts[2] if len(parts) == 3 else "HTTP/1.0"
+                connection = headers.get("connection", "").lower()
+                keep_alive = (connection == "keep-alive" or
+                              (http_version == "HTTP/1.1" and connection != "close"))
+
+                try:
+                    if len(parts) != 3:
+                        raise ApiError(400, "неверная строка запроса")
+                    status, body, extra_headers = await self.dispatch(method, parts[1], headers)
+                except ApiError as e:
+                    status, extra_headers = e.status, {"Cache-Control": "no-store"}
+                    body = json.dumps({"error": e.message}, ensure_ascii=False).encode("utf-8")
+                except Exception:
+                    traceback.print_exc()
+                    status, extra_headers = 500, {"Cache-Control": "no-store"}
+                    body = json.dumps({"error": "внутренняя ошибка"}).encode("utf-8")
+
+                if status == 405 or status == 400:
+                    keep_alive = False  # тело запроса не читаем, соединение дальше не годится
+
+                head = [f"HTTP/1.1 {status} {self.STATUS_TEXT[status]}",
+                        "Content-Type: application/json; charset=utf-8",
+                        f"Content-Length: {len(body)}",
+                        "Access-Control-Allow-Origin: *",
+                        f"Connection: {'keep-alive' if keep_alive else 'close'}"]
+                head.extend(f"{name}: {value}" for name, value in extra_headers.items())
+                writer.write(("\r\n".join(head) + "\r\n\r\n").encode("latin-1"))
+                if method != "HEAD":
+                    writer.write(body)
+                await writer.drain()
+
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    async def serve(self, host="127.0.0.1", port=8080):
+        server = await asyncio.start_server(self.handle_connection, host, port)
+        actual_port = server.sockets[0].getsockname()[1]
+        print(f"Rain2pedia API: http://{host}:{actual_port}", flush=True)
+        async with server:
+            await server.serve_forever()
+
+    def close(self):
+        self.pool.close()
+        self.db_manager.close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="JSON API каталога Rain2pedia (только чтение)")
+    parser.add_argument("--db", default="items.db", help="путь к базе данных")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8080, help="0 - любой свободный порт")
+    parser.add_argument("--pool", type=int, default=4, help="размер пула соединений")
+    args = parser.parse_args(argv)
+
+    server = CatalogServer(args.db, pool_size=args.pool)
+    try:
+        asyncio.run(server.serve(args.host, args.port))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.close()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
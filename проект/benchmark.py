@@ -0,0 +1,207 @@
+import os
+import sys
+import time
+import random
+import sqlite3
+import argparse
+import tempfile
+
+from rain2pedia import DatabaseManager, Item, StorageMaintenance, LootRoller
+
+
+RARITIES = list(Item.RARITY_ORDER)
+
+
+def timed(func, *args, **kwargs):
+    # выполняет функцию и возвращает (результат, время в секундах)
+    start = time.perf_counter()
+    result = func(*args, **kwargs)
+    return result, time.perf_counter() - start
+
+
+def make_rows(count, seed=0):
+    # генерирует строки предметов с уникальными названиями
+    rnd = random.Random(seed)
+    for i in range(count):
+        yield (f"Предмет {i:07d}", rnd.choice(RARITIES),
+               f"Описание предмета номер {i}", f"+{rnd.randint(1, 100)}% к чему-нибудь")
+
+
+def create_legacy_db(db_path, count):
+    # создает базу в старом формате (редкость текстом, без индексов и user_version)
+    conn = sqlite3.connect(db_path)
+    conn.execute('''
+        CREATE TABLE items (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            name TEXT NOT NULL,
+            rarity TEXT NOT NULL,
+            desc TEXT NOT NULL,
+            effect TEXT NOT NULL
+        )
+    ''')
+    conn.executemany("INSERT INTO items (name, rarity, desc, effect) VALUES (?, ?, ?, ?)", make_rows(count))
+    conn.commit()
+    conn.close()
+
+
+def bench_migration(args, workdir):
+    # миграция старой базы и запросы с фильтрацией в sql против фильтрации в python
+    db_path = os.path.join(workdir, "legacy.db")
+    create_legacy_db(db_path, args.rows)
+
+    db_manager, migrate_time = timed(DatabaseManager, db_path)
+    print(f"migration to v{len(db_manager.get_migrations())}: {args.rows} rows in {migrate_time:.3f} s")
+
+    items, load_time = timed(db_manager.get_all_items)
+    print(f"get_all_items: {load_time * 1000:.1f} ms")
+
+    def python_query():
+        return sorted((item for item in db_manager.get_all_items()
+                       if item.rarity == "Босс" and "99" in item.name.lower()),
+                      key=lambda x: x.name)[:50]
+
+    def sql_query():
+        return db_manager.query_items("99", "Босс", limit=50)
+
+    for label, query in [("python filter+sort+limit", python_query), ("sql filter+sort+limit", sql_query)]:
+        result, query_time = timed(query)
+        print(f"{label}: {query_time * 1000:.1f} ms ({len(result)} rows)")
+
+    page, page_time = timed(db_manager.query_items, rarity="Лунный", limit=100, offset=1000)
+    print(f"sql rarity page (limit 100 offset 1000): {page_time * 1000:.1f} ms ({len(page)} rows)")
+    db_manager.close()
+
+
+def fill_items(db_path, count):
+    # заполняет базу текущей схемы (редкость кодом)
+    conn = sqlite3.connect(db_path)
+    conn.executemany(
+        "INSERT INTO items (name, rarity_code, desc, effect) VALUES (?, ?, ?, ?)",
+        ((name, Item.RARITY_ORDER[rarity], desc, effect) for name, rarity, desc, effect in make_rows(count))
+    )
+    conn.commit()
+    conn.close()
+
+
+def bench_maintenance(args, workdir):
+    # построчное удаление против быстрой очистки, разрастание файла и его сжатие
+    db_path = os.path.join(workdir, "maintenance.db")
+    create_legacy_db(db_path, 0)  # старая база: без auto_vacuum
+    db_manager = DatabaseManager(db_path)
+    maintenance = StorageMaintenance(db_manager)
+
+    fill_items(db_path, args.rows)
+    conn = sqlite3.connect(db_path)
+    _, delete_time = timed(lambda: (conn.execute("DELETE FROM items"), conn.commit()))
+    conn.close()
+    print(f"DELETE FROM items with change triggers: {delete_time * 1000:.0f} ms")
+
+    for _ in range(3):
+        fill_items(db_path, args.rows)
+        _, truncate_time = timed(db_manager.clear_all_items)
+    print(f"truncate_items: {truncate_time * 1000:.0f} ms")
+
+    fill_items(db_path, args.rows // 10)
+    report = maintenance.run(["enable_incremental_vacuum", "incremental_vacuum", "optimize", "integrity_check"])
+    print(StorageMaintenance.format_report(report))
+    db_manager.close()
+
+
+def bench_memory(args, workdir):
+    # память каталога по подсистемам, гейт по бюджету байт на предмет
+    import memory_report
+
+    results, accounted = memory_report.measure(args.rows, table_limit=min(args.rows, 100000))
+    memory_report.print_report(args.rows, results, accounted)
+    failures = memory_report.check_budgets(args.rows, results)
+    print("memory gate: " + ("OK" if not failures else "FAIL (" + "; ".join(failures) + ")"))
+    return failures
+
+
+def bench_loot(args, workdir):
+    # миллион бросков лута: генерация и потоковая запись в csv/jsonl
+    items = [Item(name, rarity, desc, effect, i + 1)
+             for i, (name, rarity, desc, effect) in enumerate(make_rows(1000))]
+    rolls_count = 1000000
+    roller = LootRoller(items, seed=42)
+
+    rolls, roll_time = timed(roller.roll, rolls_count)
+    print(f"roll {rolls_count} x {roller.roll_size}: {roll_time:.2f} s")
+    _, count_time = timed(roller.count_by_rarity, rolls)
+    print(f"count_by_rarity: {count_time:.2f} s")
+
+    for file_format, write in (("csv", roller.write_csv), ("jsonl", roller.write_jsonl)):
+        path = os.path.join(workdir, f"rolls.{file_format}")
+        _, write_time = timed(write, path, roller.iter_chunks(rolls_count))
+        print(f"roll + stream to {file_format}: {write_time:.2f} s ({os.path.getsize(path) / 2 ** 20:.0f} MB)")
+        os.remove(path)
+
+
+def bench_startup(args, workdir):
+    # время до первой отрисовки и до загрузки каталога: пустая база (демо данные) и заполненная
+    os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+    from PyQt6.QtWidgets import QApplication
+    from rain2pedia import ItempediaApp
+
+    app = QApplication.instance() or QApplication([])
+
+    # демо данные: по строке на соединение против одной транзакции
+    demo = ItempediaApp.create_demo_data()
+    db_manager = DatabaseManager(os.path.join(workdir, "seed_rows.db"))
+    _, rows_time = timed(lambda: [db_manager.add_item(item) for item in demo])
+    db_manager.close()
+    db_manager = DatabaseManager(os.path.join(workdir, "seed_batch.db"))
+    _, batch_time = timed(db_manager.add_items, ItempediaApp.create_demo_data())
+    db_manager.close()
+    print(f"demo seed ({len(demo)} items): add_item {rows_time * 1000:.1f} ms, add_items {batch_time * 1000:.1f} ms")
+
+    rows = min(args.rows, 20000)  # таблица заполняется целиком, большие каталоги тут не показательны
+    filled_path = os.path.join(workdir, "startup_filled.db")
+    DatabaseManager(filled_path).close()
+    fill_items(filled_path, rows)
+
+    for label, db_path in (("empty db", os.path.join(workdir, "startup_empty.db")),
+                           (f"{rows} rows", filled_path)):
+        window = ItempediaApp(db_path)
+        window.show()
+        deadline = time.perf_counter() + 60
+        while "ready" not in window.startup_timings and time.perf_counter() < deadline:
+            app.processEvents()
+            time.sleep(0.001)
+        timings = ", ".join(f"{stage} {ms:.0f} ms" for stage, ms in window.startup_timings.items())
+        print(f"startup, {label}: {timings}")
+        window.close()
+
+
+BENCHMARKS = {
+    "migration": bench_migration,
+    "maintenance": bench_maintenance,
+    "memory": bench_memory,
+    "loot": bench_loot,
+    "startup": bench_startup,
+}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Бенчмарки Rain2pedia")
+    parser.add_argument("benchmarks", nargs="*", help=f"какие бенчмарки запускать: {', '.join(BENCHMARKS)}")
+    parser.add_argument("--rows", type=int, default=200000, help="количество предметов в тестовой базе")
+    args = parser.parse_args()
+
+    unknown = set(args.benchmarks) - set(BENCHMARKS)
+    if unknown:
+        parser.error(f"неизвестные бенчмарки: {', '.join(sorted(unknown))}")
+    args.benchmarks = args.benchmarks or list(BENCHMARKS)
+
+    # бенчмарк с гейтом возвращает список нарушений, любое нарушение - ненулевой код выхода
+    failures = []
+    with tempfile.TemporaryDirectory() as workdir:
+        for name in args.benchmarks:
+            print(f"== {name} ==")
+            failures.extend(BENCHMARKS[name](args, workdir) or [])
+
+    return 1 if failures else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,165 @@
+import os
+import re
+import sys
+import time
+import random
+import asyncio
+import sqlite3
+import argparse
+import tempfile
+import subprocess
+from urllib.parse import quote
+
+
+# нагрузочный тест json api: несколько keep-alive соединений шлют запросы в течение
+# заданного времени, в конце печатаются запросы в секунду и перцентили задержки
+#
+#   python load_test.py --port 8080          # против уже запущенного сервера
+#   python load_test.py --spawn 100000       # поднимает сервер на временной базе
+
+
+PATHS = [
+    "/items",
+    "/items?sort=rarity&limit=100",
+    "/items?rarity=Легендарный&limit=20",
+    "/items?search=99&limit=20",
+    "/items?offset=500&limit=50",
+    "/rarities",
+    "/item-of-the-day",
+    "/loot?count=5&seed=42",
+    "/loot?count=5",
+]
+
+
+def percentile(sorted_values, fraction):
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, int(fraction * len(sorted_values)))
+    return sorted_values[index]
+
+
+async def read_response(reader):
+    # читает один ответ, возвращает (статус, etag)
+    status_line = await reader.readline()
+    if not status_line:
+        raise ConnectionError("сервер закрыл соединение")
+    status = int(status_line.split()[1])
+    length = 0
+    etag = None
+    while True:
+        line = await reader.readline()
+        if line in (b"\r\n", b""):
+            break
+        name, _, value = line.decode("latin-1").partition(":")
+        name = name.strip().lower()
+        if name == "content-length":
+            length = int(value)
+        elif name == "etag":
+            etag = value.strip()
+    await reader.readexactly(length)
+    return status, etag
+
+
+async def worker(host, port, deadline, latencies, statuses, revalidate):
+    # одно keep-alive соединение, запросы идут последовательно
+    reader, writer = await asyncio.open_connection(host, port)
+    etags = {}
+    rnd = random.Random()
+    try:
+        while time.perf_counter() < deadline:
+            path = rnd.choice(PATHS)
+            target = quote(path, safe="/?&=")
+            request = f"GET {target} HTTP/1.1\r\nHost: {host}\r\n"
+            if revalidate and path in etags:
+                request += f"If-None-Match: {etags[path]}\r\n"
+            writer.write((request + "\r\n").encode("latin-1"))
+
+            start = time.perf_counter()
+            status, etag = await read_response(reader)
+            latencies.append(time.perf_counter() - start)
+            statuses[status] = statuses.get(status, 0) + 1
+            if etag:
+                etags[path] = etag
+    finally:
+        writer.close()
+
+
+async def run_load(host, port, connections, duration, revalidate):
+    latencies = []
+    statuses = {}
+    start = time.perf_counter()
+    deadline = start + duration
+    await asyncio.gather(*(worker(host, port, deadline, latencies, statuses, revalidate)
+                           for _ in range(connections)))
+    elapsed = time.perf_counter() - start
+    return latencies, statuses, elapsed
+
+
+def create_test_db(db_path, count):
+    # временная база для --spawn, схему создаст сам сервер через DatabaseManager
+    from rain2pedia import DatabaseManager, Item
+
+    DatabaseManager(db_path).close()
+    rarities = list(Item.RARITY_ORDER)
+    conn = sqlite3.connect(db_path)
+    conn.executemany(
+        "INSERT INTO items (name, rarity_code, desc, effect) VALUES (?, ?, ?, ?)",
+        ((f"Предмет {i:07d}", i % len(rarities), f"Описание {i}", f"+{i % 100}% к чему-нибудь")
+         for i in range(count))
+    )
+    conn.commit()
+    conn.close()
+
+
+def spawn_server(db_path):
+    # запускает api_server.py на свободном порту и ждет строку с адресом
+    script = os.path.join(os.path.dirname(os.path.abspath(__file__)), "api_server.py")
+    process = subprocess.Popen([sys.executable, script, "--db", db_path, "--port", "0"],
+                               stdout=subprocess.PIPE, text=True)
+    line = process.stdout.readline()
+    match = re.search(r"http://([^:]+):(\d+)", line)
+    if not match:
+        process.kill()
+        raise RuntimeError(f"сервер не запустился: {line!r}")
+    return process, match.group(1), int(match.group(2))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Нагрузочный тест JSON API Rain2pedia")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--connections", type=int, default=32, help="одновременных соединений")
+    parser.add_argument("--duration", type=float, default=10.0, help="длительность, секунды")
+    parser.add_argument("--revalidate", action="store_true", help="слать If-None-Match с полученным ETag")
+    parser.add_argument("--spawn", type=int, metavar="ROWS",
+                        help="поднять локальный сервер на временной базе из ROWS предметов")
+    args = parser.parse_args()
+
+    process = None
+    with tempfile.TemporaryDirectory() as workdir:
+        host, port = args.host, args.port
+        if args.spawn is not None:
+            db_path = os.path.join(workdir, "items.db")
+            create_test_db(db_path, args.spawn)
+            process, host, port = spawn_server(db_path)
+
+        try:
+            latencies, statuses, elapsed = asyncio.run(
+                run_load(host, port, args.connections, args.duration, args.revalidate))
+        finally:
+            if process is not None:
+                process.terminate()
+                process.wait()
+
+    latencies.sort()
+    print(f"requests: {len(latencies)} in {elapsed:.1f} s, {args.connections} connections")
+    print(f"throughput: {len(latencies) / elapsed:.0f} req/s")
+    print(f"latency p50: {percentile(latencies, 0.50) * 1000:.2f} ms, "
+          f"p99: {percentile(latencies, 0.99) * 1000:.2f} ms, "
+          f"max: {(latencies[-1] if latencies else 0) * 1000:.2f} ms")
+    print("statuses: " + ", ".join(f"{status}={count}" for status, count in sorted(statuses.items())))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,187 @@
+import os
+import sys
+import gc
+import argparse
+import tracemalloc
+
+# без дисплея (сервер, ci) qt рисует в память
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+
+from PyQt6.QtWidgets import QApplication, QTableWidget, QTableWidgetItem
+
+from rain2pedia import Item, ItemView, ItemFilter, LootGeneratorDialog
+
+
+# отчет о памяти каталога по подсистемам:
+#   catalog      - список Item со строками
+#   view         - отсортированный вид (ItemView) поверх каталога
+#   filter_cache - стек результатов ItemFilter после набора запроса
+#   table        - QTableWidget со строками каталога (память qt видна только в rss)
+#   loot_dialog  - один LootGeneratorDialog
+#
+# python байты считает tracemalloc, c++ часть qt - прирост rss процесса
+
+
+DEFAULT_COUNTS = (10000, 100000, 1000000)
+
+# бюджет python-памяти на предмет для гейта в бенчмарке, байты
+MEMORY_BUDGETS = {
+    "catalog": 600,  # ~460 Б: предмет со __slots__ и четыре строки
+    "view": 8,  # 4 Б: индекс в array('I')
+    "filter_cache": 32,  # по 4 Б на каждый уровень стека
+}
+
+RARITIES = list(Item.RARITY_ORDER)
+
+
+def get_rss():
+    # текущий rss процесса в байтах (только linux), None если недоступно
+    try:
+        with open("/proc/self/statm") as file:
+            return int(file.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+def deep_size(items):
+    # учет объектов: сами предметы, их строки и список
+    size = sys.getsizeof(items)
+    for item in items:
+        size += sys.getsizeof(item)
+        for value in (item.id, item.name, item.rarity, item.desc, item.effect):
+            size += sys.getsizeof(value)
+    return size
+
+
+def make_items(count):
+    # предметы с уникальными строками, как после загрузки из базы
+    return [Item(f"Предмет {i:07d}", RARITIES[i % len(RARITIES)], f"Описание предмета номер {i}",
+                 f"+{i % 100}% к чему-нибудь", i + 1) for i in range(count)]
+
+
+class Measurement:
+    # замер прироста python-памяти и rss вокруг построения подсистемы
+
+    def __enter__(self):
+        gc.collect()
+        self.traced = tracemalloc.get_traced_memory()[0]
+        self.rss = get_rss()
+        return self
+
+    def __exit__(self, *exc_info):
+        gc.collect()
+        self.python_bytes = tracemalloc.get_traced_memory()[0] - self.traced
+        rss = get_rss()
+        self.rss_bytes = rss - self.rss if rss is not None and self.rss is not None else None
+        return False
+
+
+def fill_table(table, view):
+    # то же заполнение, что и ItempediaApp.update_items_table
+    table.setRowCount(len(view))
+    for row, item in enumerate(view):
+        name_item = QTableWidgetItem(item.name)
+        name_item.setForeground(item.get_rarity_color())
+        rarity_item = QTableWidgetItem(item.rarity)
+        rarity_item.setForeground(item.get_rarity_color())
+        table.setItem(row, 0, name_item)
+        table.setItem(row, 1, rarity_item)
+        table.setItem(row, 2, QTableWidgetItem(item.desc))
+        table.setItem(row, 3, QTableWidgetItem(item.effect))
+
+
+def measure(count, table_limit=100000):
+    # возвращает {подсистема: (python байты, rss байты или None)} и учет объектов каталога
+    app = QApplication.instance() or QApplication([])
+    results = {}
+    started = not tracemalloc.is_tracing()
+    if started:
+        tracemalloc.start()
+
+    with Measurement() as m:
+        items = make_items(count)
+    results["catalog"] = (m.python_bytes, m.rss_bytes)
+    accounted = deep_size(items)
+
+    with Measurement() as m:
+        view = ItemView(items)
+        view.sort(key=lambda x: x.name)
+    results["view"] = (m.python_bytes, m.rss_bytes)
+
+    with Measurement() as m:
+        item_filter = ItemFilter(items)
+        for query in ("п", "пр", "пре", "пред"):
+            item_filter.filter(query, ItemFilter.ALL_RARITIES)
+    results["filter_cache"] = (m.python_bytes, m.rss_bytes)
+
+    table = None
+    if count <= table_limit:
+        with Measurement() as m:
+            table = QTableWidget(0, 4)
+            fill_table(table, view)
+        results["table"] = (m.python_bytes, m.rss_bytes)
+
+    with Measurement() as m:
+        dialog = LootGeneratorDialog(items)
+    results["loot_dialog"] = (m.python_bytes, m.rss_bytes)
+
+    dialog.deleteLater()
+    if table is not None:
+        table.deleteLater()
+    app.processEvents()
+    if started:
+        tracemalloc.stop()
+    return results, accounted
+
+
+def format_bytes(value):
+    if value is None:
+        return "n/a"
+    for unit in ("Б", "КБ", "МБ"):
+        if abs(value) < 1024:
+            return f"{value:.0f} {unit}"
+        value /= 1024
+    return f"{value:.1f} ГБ"
+
+
+def print_report(count, results, accounted):
+    print(f"-- {count} предметов --")
+    print(f"{'подсистема':<14}{'python':>12}{'на предмет':>12}{'rss':>12}")
+    for name, (python_bytes, rss_bytes) in results.items():
+        print(f"{name:<14}{format_bytes(python_bytes):>12}{python_bytes / count:>10.1f} Б"
+              f"{format_bytes(rss_bytes):>12}")
+    print(f"учет объектов каталога (getsizeof): {format_bytes(accounted)}, "
+          f"{accounted / count:.1f} Б на предмет")
+
+
+def check_budgets(count, results):
+    # возвращает список превышений бюджета памяти на предмет
+    failures = []
+    for name, budget in MEMORY_BUDGETS.items():
+        per_item = results[name][0] / count
+        if per_item > budget:
+            failures.append(f"{name}: {per_item:.1f} Б на предмет > {budget} Б")
+    return failures
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Отчет о памяти каталога Rain2pedia")
+    parser.add_argument("counts", nargs="*", type=int, default=list(DEFAULT_COUNTS),
+                        help="размеры каталога")
+    parser.add_argument("--table-limit", type=int, default=100000,
+                        help="не строить таблицу для каталогов больше этого размера")
+    args = parser.parse_args(argv)
+
+    failures = []
+    for count in args.counts:
+        results, accounted = measure(count, args.table_limit)
+        print_report(count, results, accounted)
+        failures.extend(check_budgets(count, results))
+
+    for failure in failures:
+        print(f"ПРЕВЫШЕН БЮДЖЕТ: {failure}")
+    return 1 if failures else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
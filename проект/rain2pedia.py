@@ -1,19 +1,31 @@
+import os
 import sys
+import io
 import csv
+import json
 import sqlite3
 import random
+import threading
+import time
+from array import array
+from bisect import bisect_left
+from collections import Counter, deque
 from datetime import datetime
+from pathlib import Path
 from PyQt6.QtWidgets import (QApplication, QMainWindow, QWidget, QVBoxLayout,
                              QHBoxLayout, QTableWidget, QTableWidgetItem,
                              QLineEdit, QComboBox, QPushButton, QLabel,
                              QDialog, QTextEdit, QFileDialog, QMessageBox,
-                             QHeaderView, QFormLayout, QGroupBox, QFrame)
-from PyQt6.QtCore import Qt
-from PyQt6.QtGui import QPalette, QColor
+                             QHeaderView, QFormLayout, QGroupBox, QFrame,
+                             QSpinBox, QListView, QInputDialog)
+from PyQt6.QtCore import Qt, QTimer, QThread, pyqtSignal, QAbstractListModel, QModelIndex
+from PyQt6.QtGui import QPalette, QColor, QKeySequence
 
 
 class Item:
     # класс для представления предметов
+    # __slots__ вместо __dict__ экономит ~100 байт на предмет в больших каталогах
+    __slots__ = ("id", "name", "rarity", "desc", "effect")
 
     RARITY_COLORS = {
         "Обычный": QColor(200, 200, 200),  # серый
@@ -28,7 +40,8 @@ class Item:
     RARITY_ORDER = {"Обычный": 0, "Необычный": 1, "Легендарный": 2,
                     "Босс": 3, "Лунный": 4, "Снаряжение": 5, "Бездонный": 6}
 
-    def __init__(self, name, rarity, desc, effect):
+    def __init__(self, name, rarity, desc, effect, item_id=None):
+        self.id = item_id  # id строки в базе данных, None если еще не сохранен
         self.name = name
         self.rarity = rarity
         self.desc = desc
@@ -42,18 +55,232 @@ class Item:
         # возвращает порядковый номер редкости для сортировки
         return self.RARITY_ORDER.get(self.rarity, 0)
 
+    def get_values(self):
+        # возвращает редактируемые поля предмета кортежем
+        return (self.name, self.rarity, self.desc, self.effect)
+
+
+def pick_item_of_the_day(items, day):
+    # выбирает предмет дня, дата используется как сид(seed)
+    # отдельный генератор, чтобы не трогать глобальный random
+    # приложение и api-сервер передают предметы (или их id) по возрастанию id, иначе выбор разойдется
+    if not items:
+        return None
+    return random.Random(day.toordinal()).choice(items)
+
+
+class IdPool:
+    # отсортированные id сохраненных предметов - набор для выбора предмета дня, как в api-сервере
+    # полная сортировка только при загрузке, дальше точечные вставки и удаления через bisect
+
+    def __init__(self, ids=()):
+        self.ids = sorted(ids)
+
+    def __len__(self):
+        return len(self.ids)
+
+    def add(self, item_id):
+        # возвращает True, если id новый
+        index = bisect_left(self.ids, item_id)
+        if index < len(self.ids) and self.ids[index] == item_id:
+            return False
+        self.ids.insert(index, item_id)
+        return True
+
+    def discard(self, item_id):
+        # возвращает True, если id был в наборе
+        index = bisect_left(self.ids, item_id)
+        if index < len(self.ids) and self.ids[index] == item_id:
+            del self.ids[index]
+            return True
+        return False
+
+    def pick(self, day):
+        # id предмета дня или None
+        return pick_item_of_the_day(self.ids, day)
+
+
+class ItemView:
+    # отфильтрованный и отсортированный вид каталога: индексы в общем списке вместо копии
+    # (4 байта на строку); после изменения общего списка вид нужно построить заново
+
+    def __init__(self, items, indices=None):
+        self.items = items
+        self.indices = indices  # None - все предметы в исходном порядке
+
+    def __len__(self):
+        return len(self.items) if self.indices is None else len(self.indices)
+
+    def __getitem__(self, row):
+        return self.items[row if self.indices is None else self.indices[row]]
+
+    def __iter__(self):
+        if self.indices is None:
+            return iter(self.items)
+        items = self.items
+        return (items[index] for index in self.indices)
+
+    def sort(self, key):
+        # сортирует индексы, сам список предметов не трогает
+        items = self.items
+        source = range(len(items)) if self.indices is None else self.indices
+        self.indices = array('I', sorted(source, key=lambda index: key(items[index])))
+
+
+class ItemFilter:
+    # движок фильтрации с кэшем последних результатов
+    # при уточнении запроса ("ш" -> "шп") проверяем только предыдущие результаты,
+    # а при стирании символа берем уже готовый набор из стека
+
+    ALL_RARITIES = "Все редкости"
+
+    def __init__(self, items=None, max_depth=32):
+        self.max_depth = max_depth
+        self.items = []
+        self.stack = []  # список кортежей (поиск, редкость, индексы результатов)
+        self.reset(items or [])
+
+    def reset(self, items):
+        # сбрасывает кэш, вызывается при любом изменении списка предметов
+        self.items = items
+        self.stack.clear()
+
+    def is_narrowing(self, old_query, new_query):
+        # True если каждый результат нового запроса входит в результаты старого
+        old_text, old_rarity = old_query
+        new_text, new_rarity = new_query
+        return (old_text in new_text and
+                (old_rarity == self.ALL_RARITIES or old_rarity == new_rarity))
+
+    def matches(self, item, search_text, rarity_filter):
+        # проверяет подходит ли предмет под запрос
+        return ((search_text in item.name.lower() or search_text in item.desc.lower() or
+                 search_text in item.effect.lower())
+                and (rarity_filter == self.ALL_RARITIES or item.rarity == rarity_filter))
+
+    def filter(self, search_text, rarity_filter):
+        # возвращает индексы (array) предметов, подходящих под запрос
+        query = (search_text, rarity_filter)
+
+        # снимаем со стека наборы, которые не являются "родителями" нового запроса
+        while self.stack and not self.is_narrowing(self.stack[-1][:2], query):
+            self.stack.pop()
+
+        if self.stack and self.stack[-1][:2] == query:
+            return self.stack[-1][2]
+
+        items = self.items
+        source = self.stack[-1][2] if self.stack else range(len(items))
+        results = array('I', (index for index in source
+                              if self.matches(items[index], search_text, rarity_filter)))
+
+        self.stack.append((search_text, rarity_filter, results))
+        if len(self.stack) > self.max_depth:
+            del self.stack[0]
+        return results
+
 
 class DatabaseManager:
     # менеджер базы данных sqlite
 
+    # общая часть запросов, возвращающих предметы (редкость берется из справочника)
+    ITEMS_SELECT = '''
+        SELECT items.id, items.name, rarities.name, items.desc, items.effect
+        FROM items JOIN rarities ON rarities.code = items.rarity_code
+    '''
+
+    # item_id записи журнала, означающей полную очистку каталога
+    CATALOG_RESET = 0
+
+    # размер страницы новой базы (для существующей меняется только через VACUUM,
+    # см. "Сервис → Сжатие с другим размером страницы")
+    DEFAULT_PAGE_SIZE = 4096
+    PAGE_SIZES = (1024, 2048, 4096, 8192, 16384, 32768, 65536)
+
+    # ожидание блокировки при опросе журнала из потока интерфейса, секунды:
+    # занятая база не должна подвешивать окно, опрос просто повторится
+    SYNC_TIMEOUT = 0.1
+
+    # через сколько секунд без синхронизации читатель журнала считается мертвым
+    READER_EXPIRY = 24 * 3600
+
     def __init__(self, db_path="items.db"):
         self.db_path = db_path
+        self.watch_conn = None  # постоянное соединение для PRAGMA data_version
+        self.data_version = None
+        self.sync_needed = False  # изменения замечены, но еще не подтверждены mark_synced
+        self.reader_id = None  # строка этого процесса в change_readers
+        self.own_reset_seq = None  # seq последней очистки, сделанной этим менеджером
+        self.migration_notes = []  # сообщения миграций для пользователя
         self.init_database()
 
+    def get_connection(self, read_only=False, timeout=5.0):
+        # открывает соединение с функцией py_lower (встроенный lower понимает только ascii)
+        # соединения только для чтения можно передавать между потоками (пул api-сервера)
+        if read_only:
+            uri = f"{Path(self.db_path).resolve().as_uri()}?mode=ro"
+            conn = sqlite3.connect(uri, uri=True, timeout=timeout, check_same_thread=False)
+        else:
+            conn = sqlite3.connect(self.db_path, timeout=timeout)
+        conn.create_function("py_lower", 1, lambda text: text.lower() if text else text, deterministic=True)
+        return conn
+
     def init_database(self):
-        # инициализация базы данных
-        conn = sqlite3.connect(self.db_path)
+        # инициализация базы данных и применение миграций
+        self.migrate()
+
+    def get_migrations(self):
+        # список миграций, номер версии схемы = позиция в списке + 1
+        return [self.migrate_v1, self.migrate_v2, self.migrate_v3]
+
+    def migrate(self):
+        # поднимает схему до последней версии (PRAGMA user_version) одной транзакцией
+        migrations = self.get_migrations()
+        conn = self.get_connection()
+        conn.isolation_level = None  # транзакцией управляем сами
         cursor = conn.cursor()
+
+        # у новой базы размер страницы и инкрементальный вакуум задаются до создания таблиц
+        if cursor.execute("PRAGMA page_count").fetchone()[0] == 0:
+            cursor.execute(f"PRAGMA page_size = {self.DEFAULT_PAGE_SIZE}")
+            cursor.execute("PRAGMA auto_vacuum = INCREMENTAL")
+
+        try:
+            cursor.execute("BEGIN IMMEDIATE")
+            version = cursor.execute("PRAGMA user_version").fetchone()[0]
+            for number, migration in enumerate(migrations[version:], start=version + 1):
+                migration(cursor)
+                cursor.execute(f"PRAGMA user_version = {number}")
+            cursor.execute("COMMIT")
+        except Exception:
+            cursor.execute("ROLLBACK")
+            raise
+        finally:
+            conn.close()
+
+    def create_change_triggers(self, cursor):
+        # триггеры заполняют журнал изменений из любого процесса
+        cursor.execute('''
+            CREATE TRIGGER IF NOT EXISTS items_after_insert AFTER INSERT ON items
+            BEGIN
+                INSERT INTO item_changes (item_id) VALUES (NEW.id);
+            END
+        ''')
+        cursor.execute('''
+            CREATE TRIGGER IF NOT EXISTS items_after_update AFTER UPDATE ON items
+            BEGIN
+                INSERT INTO item_changes (item_id) VALUES (NEW.id);
+            END
+        ''')
+        cursor.execute('''
+            CREATE TRIGGER IF NOT EXISTS items_after_delete AFTER DELETE ON items
+            BEGIN
+                INSERT INTO item_changes (item_id) VALUES (OLD.id);
+            END
+        ''')
+
+    def migrate_v1(self, cursor):
+        # исходная схема: редкость хранится текстом
         cursor.execute('''
             CREATE TABLE IF NOT EXISTS items (
                 id INTEGER PRIMARY KEY AUTOINCREMENT,
@@ -63,66 +290,475 @@ class DatabaseManager:
                 effect TEXT NOT NULL
             )
         ''')
-        conn.commit()
+
+        # журнал изменений
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS item_changes (
+                seq INTEGER PRIMARY KEY AUTOINCREMENT,
+                item_id INTEGER NOT NULL
+            )
+        ''')
+        self.create_change_triggers(cursor)
+
+    def migrate_v2(self, cursor):
+        # редкость переезжает в справочник с целочисленными кодами, добавляются индексы
+        # коды известных редкостей совпадают с Item.RARITY_ORDER, поэтому сортировка по коду = по редкости
+        cursor.execute('''
+            CREATE TABLE rarities (
+                code INTEGER PRIMARY KEY,
+                name TEXT NOT NULL UNIQUE
+            )
+        ''')
+        cursor.executemany(
+            "INSERT INTO rarities (code, name) VALUES (?, ?)",
+            [(code, name) for name, code in Item.RARITY_ORDER.items()]
+        )
+        # незнакомые редкости из старых данных получают следующие коды
+        cursor.execute('''
+            INSERT OR IGNORE INTO rarities (name)
+            SELECT DISTINCT trim(rarity) FROM items ORDER BY 1
+        ''')
+
+        cursor.execute('''
+            CREATE TABLE items_new (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                name TEXT NOT NULL,
+                rarity_code INTEGER NOT NULL REFERENCES rarities (code),
+                desc TEXT NOT NULL,
+                effect TEXT NOT NULL
+            )
+        ''')
+        # дубликаты по естественному ключу (название + редкость) в новую таблицу не попадут,
+        # остается запись с меньшим id; остальные сохраняются как есть в items_duplicates
+        cursor.execute('''
+            SELECT COUNT(*) - (SELECT COUNT(*) FROM (SELECT 1 FROM items GROUP BY name, trim(rarity)))
+            FROM items
+        ''')
+        duplicates = cursor.fetchone()[0]
+        if duplicates:
+            cursor.execute('''
+                CREATE TABLE items_duplicates (
+                    id INTEGER PRIMARY KEY,
+                    name TEXT NOT NULL,
+                    rarity TEXT NOT NULL,
+                    desc TEXT NOT NULL,
+                    effect TEXT NOT NULL
+                )
+            ''')
+            cursor.execute('''
+                INSERT INTO items_duplicates (id, name, rarity, desc, effect)
+                SELECT id, name, rarity, desc, effect FROM items
+                WHERE id NOT IN (SELECT MIN(id) FROM items GROUP BY name, trim(rarity))
+            ''')
+            self.migration_notes.append(
+                f"Найдено повторяющихся предметов (то же название и редкость): {duplicates}. "
+                f"В каталоге оставлена первая запись, остальные сохранены в таблице items_duplicates.")
+
+        # уникальный индекс создается до копирования, повторы отбрасывает INSERT OR IGNORE
+        cursor.execute("CREATE UNIQUE INDEX items_natural_key ON items_new (name, rarity_code)")
+        cursor.execute('''
+            INSERT OR IGNORE INTO items_new (id, name, rarity_code, desc, effect)
+            SELECT items.id, items.name, rarities.code, items.desc, items.effect
+            FROM items JOIN rarities ON rarities.name = trim(items.rarity)
+            ORDER BY items.id
+        ''')
+        cursor.execute("DROP TABLE items")
+        cursor.execute("ALTER TABLE items_new RENAME TO items")
+
+        cursor.execute("CREATE INDEX items_rarity_name ON items (rarity_code, name)")
+        self.create_change_triggers(cursor)
+
+    def migrate_v3(self, cursor):
+        # читатели журнала изменений: строки item_changes, которые прочитали все, удаляются
+        cursor.execute('''
+            CREATE TABLE change_readers (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                seq INTEGER NOT NULL,
+                seen_at REAL NOT NULL
+            )
+        ''')
+
+    def get_rarity_code(self, cursor, rarity):
+        # возвращает код редкости, при необходимости добавляя ее в справочник
+        cursor.execute("INSERT OR IGNORE INTO rarities (name) VALUES (?)", (rarity,))
+        cursor.execute("SELECT code FROM rarities WHERE name = ?", (rarity,))
+        return cursor.fetchone()[0]
+
+    def has_external_changes(self):
+        # дешевая проверка: изменилась ли база с прошлой синхронизации
+        # data_version меняется, когда коммитит любое другое соединение; замеченное изменение
+        # помнится, пока вызывающий не подтвердит его через mark_synced (чтение могло упасть)
+        if self.watch_conn is None:
+            self.watch_conn = sqlite3.connect(self.db_path, timeout=self.SYNC_TIMEOUT)
+        version = self.watch_conn.execute("PRAGMA data_version").fetchone()[0]
+        if self.data_version is not None and version != self.data_version:
+            self.sync_needed = True
+        self.data_version = version
+        return self.sync_needed
+
+    def mark_synced(self):
+        # изменения, замеченные has_external_changes, прочитаны
+        self.sync_needed = False
+
+    def register_reader(self):
+        # регистрирует процесс читателем журнала (или обновляет регистрацию), возвращает текущий seq
+        # строки журнала после позиции живого читателя не удаляются
+        conn = self.get_connection()
+        conn.isolation_level = None  # транзакцией управляем сами
+        cursor = conn.cursor()
+        try:
+            cursor.execute("BEGIN IMMEDIATE")
+            seq = self.get_last_change_seq(conn)
+            if self.reader_id is not None:
+                cursor.execute("UPDATE change_readers SET seq = ?, seen_at = ? WHERE id = ?",
+                               (seq, time.time(), self.reader_id))
+            if self.reader_id is None or cursor.rowcount == 0:
+                cursor.execute("INSERT INTO change_readers (seq, seen_at) VALUES (?, ?)", (seq, time.time()))
+                self.reader_id = cursor.lastrowid
+            cursor.execute("COMMIT")
+        finally:
+            conn.close()  # при ошибке незакоммиченная транзакция откатывается
+        return seq
+
+    def release_changes(self, seq):
+        # сдвигает позицию читателя и удаляет строки журнала, прочитанные всеми живыми читателями
+        # False - регистрация истекла и журнал могли обрезать без нас, нужна полная перезагрузка
+        if self.reader_id is None:
+            return False
+        conn = self.get_connection(timeout=self.SYNC_TIMEOUT)
+        cursor = conn.cursor()
+        try:
+            now = time.time()
+            cursor.execute("UPDATE change_readers SET seq = ?, seen_at = ? WHERE id = ?",
+                           (seq, now, self.reader_id))
+            if cursor.rowcount == 0:
+                return False
+            cursor.execute("DELETE FROM change_readers WHERE seen_at < ?", (now - self.READER_EXPIRY,))
+            # последняя строка остается всегда: MAX(seq) - версия каталога для api-сервера
+            cursor.execute('''
+                DELETE FROM item_changes
+                WHERE seq < (SELECT MIN(seq) FROM change_readers)
+                AND seq < (SELECT MAX(seq) FROM item_changes)
+            ''')
+            conn.commit()
+        finally:
+            conn.close()
+        return True
+
+    def get_last_change_seq(self, conn=None):
+        # возвращает номер последней записи в журнале изменений (версия каталога)
+        # переданное соединение (например из пула) не закрывается
+        own_conn = conn is None
+        if own_conn:
+            conn = self.get_connection()
+        cursor = conn.cursor()
+        cursor.execute("SELECT COALESCE(MAX(seq), 0) FROM item_changes")
+        seq = cursor.fetchone()[0]
+        if own_conn:
+            conn.close()
+        return seq
+
+    def get_changes_since(self, seq):
+        # возвращает (последний seq, измененные предметы, id удаленных предметов)
+        # если другой процесс очистил каталог - (последний seq, None, None), нужна полная перезагрузка
+        # вызывается из потока интерфейса, поэтому блокировку ждет недолго
+        conn = self.get_connection(timeout=self.SYNC_TIMEOUT)
+        cursor = conn.cursor()
+        cursor.execute(
+            "SELECT MAX(seq) FROM item_changes WHERE seq > ? AND item_id = ?",
+            (seq, self.CATALOG_RESET)
+        )
+        reset_seq = cursor.fetchone()[0]
+        if reset_seq is not None:
+            if reset_seq != self.own_reset_seq:
+                cursor.execute("SELECT MAX(seq) FROM item_changes")
+                last_seq = cursor.fetchone()[0]
+                conn.close()
+                return last_seq, None, None
+            # свою очистку память уже отражает, берем только то, что было после нее
+            seq = reset_seq
+
+        cursor.execute(
+            "SELECT item_id, MAX(seq) FROM item_changes WHERE seq > ? GROUP BY item_id",
+            (seq,)
+        )
+        changed = cursor.fetchall()
+        last_seq = max((row[1] for row in changed), default=seq)
+
+        changed_ids = [row[0] for row in changed]
+        items = []
+        # читаем пачками, чтобы не упереться в лимит параметров sqlite
+        for start in range(0, len(changed_ids), 500):
+            chunk = changed_ids[start:start + 500]
+            cursor.execute(
+                f"{self.ITEMS_SELECT} WHERE items.id IN ({','.join('?' * len(chunk))})",
+                chunk
+            )
+            for item_id, name, rarity, desc, effect in cursor.fetchall():
+                items.append(Item(name, rarity, desc, effect, item_id))
         conn.close()
 
-    def get_all_items(self):
+        present_ids = {item.id for item in items}
+        deleted_ids = [item_id for item_id in changed_ids if item_id not in present_ids]
+        return last_seq, items, deleted_ids
+
+    def close(self):
+        # снимает регистрацию читателя журнала и закрывает постоянное соединение
+        if self.reader_id is not None:
+            try:
+                conn = self.get_connection()
+                conn.execute("DELETE FROM change_readers WHERE id = ?", (self.reader_id,))
+                conn.commit()
+                conn.close()
+            except sqlite3.Error:
+                pass  # строка истечет сама через READER_EXPIRY
+            self.reader_id = None
+        if self.watch_conn is not None:
+            self.watch_conn.close()
+            self.watch_conn = None
+
+    def get_all_items(self, conn=None):
         # получает все предметы из базы данных
-        conn = sqlite3.connect(self.db_path)
+        own_conn = conn is None
+        if own_conn:
+            conn = self.get_connection()
         cursor = conn.cursor()
-        cursor.execute("SELECT name, rarity, desc, effect FROM items")
+        cursor.execute(f"{self.ITEMS_SELECT} ORDER BY items.id")
         items_data = cursor.fetchall()
-        conn.close()
+        if own_conn:
+            conn.close()
 
         items = []
-        for name, rarity, desc, effect in items_data:
-            items.append(Item(name, rarity, desc, effect))
+        for item_id, name, rarity, desc, effect in items_data:
+            items.append(Item(name, rarity, desc, effect, item_id))
         return items
 
-    def add_item(self, item):
-        # добавляет предмет в базу данных
-        conn = sqlite3.connect(self.db_path)
+    def build_filter(self, search_text="", rarity=None):
+        # собирает условие WHERE для поиска и фильтра по редкости
+        conditions = []
+        params = []
+        if rarity:
+            # код редкости ищется через подзапрос, чтобы сработал индекс (rarity_code, name)
+            conditions.append("items.rarity_code = (SELECT code FROM rarities WHERE name = ?)")
+            params.append(rarity)
+        if search_text:
+            conditions.append(
+                "(instr(py_lower(items.name), ?) OR instr(py_lower(items.desc), ?) OR instr(py_lower(items.effect), ?))"
+            )
+            params.extend([search_text.lower()] * 3)
+        where = f" WHERE {' AND '.join(conditions)}" if conditions else ""
+        return where, params
+
+    def get_item(self, item_id, conn=None):
+        # возвращает предмет по id или None
+        own_conn = conn is None
+        if own_conn:
+            conn = self.get_connection()
         cursor = conn.cursor()
+        cursor.execute(f"{self.ITEMS_SELECT} WHERE items.id = ?", (item_id,))
+        row = cursor.fetchone()
+        if own_conn:
+            conn.close()
+        if row is None:
+            return None
+        item_id, name, rarity, desc, effect = row
+        return Item(name, rarity, desc, effect, item_id)
+
+    def get_rarities(self, conn=None):
+        # возвращает названия редкостей в порядке кодов
+        own_conn = conn is None
+        if own_conn:
+            conn = self.get_connection()
+        cursor = conn.cursor()
+        cursor.execute("SELECT name FROM rarities ORDER BY code")
+        rarities = [row[0] for row in cursor.fetchall()]
+        if own_conn:
+            conn.close()
+        return rarities
+
+    def query_items(self, search_text="", rarity=None, sort_by="name", limit=None, offset=0, conn=None):
+        # фильтрует, сортирует и ограничивает выборку на стороне sql
+        # sort_by: "name" или "rarity" (порядок редкостей, затем название)
+        where, params = self.build_filter(search_text, rarity)
+        order = "items.rarity_code, items.name" if sort_by == "rarity" else "items.name"
+        sql = f"{self.ITEMS_SELECT}{where} ORDER BY {order}"
+        if limit is not None:
+            sql += " LIMIT ? OFFSET ?"
+            params.extend([limit, offset])
+
+        own_conn = conn is None
+        if own_conn:
+            conn = self.get_connection()
+        cursor = conn.cursor()
+        cursor.execute(sql, params)
+        items = [Item(name, rarity_name, desc, effect, item_id)
+                 for item_id, name, rarity_name, desc, effect in cursor.fetchall()]
+        if own_conn:
+            conn.close()
+        return items
+
+    def count_items(self, search_text="", rarity=None, conn=None):
+        # считает предметы, подходящие под фильтр
+        where, params = self.build_filter(search_text, rarity)
+        own_conn = conn is None
+        if own_conn:
+            conn = self.get_connection()
+        cursor = conn.cursor()
+        cursor.execute(f"SELECT COUNT(*) FROM items{where}", params)
+        count = cursor.fetchone()[0]
+        if own_conn:
+            conn.close()
+        return count
+
+    def insert_item(self, cursor, item):
+        # вставляет предмет; если у предмета уже есть id (отмена удаления), он сохраняется
         cursor.execute(
-            "INSERT INTO items (name, rarity, desc, effect) VALUES (?, ?, ?, ?)",
-            (item.name, item.rarity, item.desc, item.effect)
+            "INSERT INTO items (id, name, rarity_code, desc, effect) VALUES (?, ?, ?, ?, ?)",
+            (item.id, item.name, self.get_rarity_code(cursor, item.rarity), item.desc, item.effect)
         )
-        conn.commit()
-        conn.close()
+        item.id = cursor.lastrowid
+
+    def update_item_row(self, cursor, item, values):
+        # записывает значения (название, редкость, описание, эффект) в строку предмета
+        name, rarity, desc, effect = values
+        cursor.execute(
+            "UPDATE items SET name = ?, rarity_code = ?, desc = ?, effect = ? WHERE id = ?",
+            (name, self.get_rarity_code(cursor, rarity), desc, effect, item.id)
+        )
+
+    def remove_item(self, cursor, item):
+        # удаляет строку предмета
+        if item.id is not None:
+            cursor.execute("DELETE FROM items WHERE id = ?", (item.id,))
+        else:
+            # название и редкость - уникальный ключ
+            cursor.execute(
+                "DELETE FROM items WHERE name = ? AND rarity_code = (SELECT code FROM rarities WHERE name = ?)",
+                (item.name, item.rarity)
+            )
+
+    def apply_mutations(self, mutations):
+        # применяет пачку изменений одной транзакцией, возвращает список ошибок
+        # изменение, нарушившее ограничения базы, пропускается, остальные сохраняются
+        # при любой другой ошибке откатывается вся пачка, ее можно повторить целиком
+        errors = []
+        added = []  # (предмет, id до вставки): после отката выданные id недействительны
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        try:
+            for mutation in mutations:
+                # восстановление после очистки раскладываем на отдельные вставки
+                if mutation[0] == "restore":
+                    steps = [("add", item) for item in mutation[1]]
+                else:
+                    steps = [mutation]
+
+                for op, *args in steps:
+                    try:
+                        if op == "add":
+                            added.append((args[0], args[0].id))
+                            self.insert_item(cursor, args[0])
+                        elif op == "update":
+                            self.update_item_row(cursor, args[0], args[2])
+                        elif op == "delete":
+                            self.remove_item(cursor, args[0])
+                        elif op == "clear":
+                            self.truncate_items(cursor)
+                    except sqlite3.IntegrityError as e:
+                        errors.append(((op, *args), e))
+            conn.commit()
+        except Exception:
+            for item, item_id in added:
+                item.id = item_id
+            raise
+        finally:
+            conn.close()  # при ошибке незакоммиченная транзакция откатывается
+        return errors
+
+    def add_item(self, item):
+        # добавляет предмет в базу данных
+        # если предмет с таким названием и редкостью уже есть - sqlite3.IntegrityError
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        try:
+            self.insert_item(cursor, item)
+            conn.commit()
+        finally:
+            conn.close()  # при ошибке незакоммиченная транзакция откатывается
+
+    def add_items(self, items):
+        # добавляет много новых предметов одной транзакцией через executemany
+        # при дубликате откатывается вся пачка (sqlite3.IntegrityError)
+        conn = self.get_connection()
+        conn.isolation_level = None  # транзакцией управляем сами
+        cursor = conn.cursor()
+        try:
+            cursor.execute("BEGIN IMMEDIATE")
+            codes = {rarity: self.get_rarity_code(cursor, rarity) for rarity in {item.rarity for item in items}}
+            last_id = cursor.execute("SELECT COALESCE(MAX(id), 0) FROM items").fetchone()[0]
+            cursor.executemany(
+                "INSERT INTO items (name, rarity_code, desc, effect) VALUES (?, ?, ?, ?)",
+                [(item.name, codes[item.rarity], item.desc, item.effect) for item in items]
+            )
+            # под блокировкой записи autoincrement выдает id подряд в порядке вставки
+            cursor.execute("SELECT id FROM items WHERE id > ? ORDER BY id", (last_id,))
+            for item, (item_id,) in zip(items, cursor.fetchall()):
+                item.id = item_id
+            cursor.execute("COMMIT")
+        except Exception:
+            if conn.in_transaction:
+                cursor.execute("ROLLBACK")
+            raise
+        finally:
+            conn.close()
 
     def delete_item(self, item):
         # удаляет предмет из базы данных
-        conn = sqlite3.connect(self.db_path)
+        conn = self.get_connection()
         cursor = conn.cursor()
-        cursor.execute(
-            "DELETE FROM items WHERE name = ? AND rarity = ? AND desc = ? AND effect = ?",
-            (item.name, item.rarity, item.desc, item.effect)
-        )
+        self.remove_item(cursor, item)
         conn.commit()
         conn.close()
 
+    def truncate_items(self, cursor):
+        # быстрая очистка: у таблицы без триггеров sqlite стирает данные целиком, а не построчно,
+        # поэтому триггеры снимаются, а в журнал вместо n удалений пишется одна метка очистки
+        if not cursor.connection.in_transaction:
+            cursor.execute("BEGIN")
+        for trigger in ("items_after_insert", "items_after_update", "items_after_delete"):
+            cursor.execute(f"DROP TRIGGER IF EXISTS {trigger}")
+        cursor.execute("DELETE FROM items")
+        cursor.execute("DELETE FROM item_changes")
+        cursor.execute("INSERT INTO item_changes (item_id) VALUES (?)", (self.CATALOG_RESET,))
+        self.own_reset_seq = cursor.lastrowid
+        self.create_change_triggers(cursor)
+
     def clear_all_items(self):
         # очищает все предметы из базы данных
-        conn = sqlite3.connect(self.db_path)
+        conn = self.get_connection()
         cursor = conn.cursor()
-        cursor.execute("DELETE FROM items")
-        conn.commit()
-        conn.close()
+        try:
+            self.truncate_items(cursor)
+            conn.commit()
+        finally:
+            conn.close()
 
     def import_from_csv(self, csv_path):
         # импортирует предметы из csv файла
+        # пробелы вокруг значений обрезаются, уже существующие предметы пропускаются
         imported_count = 0
-        conn = sqlite3.connect(self.db_path)
+        conn = self.get_connection()
         cursor = conn.cursor()
 
         with open(csv_path, 'r', encoding='utf-8') as file:
-            reader = csv.DictReader(file)
+            reader = csv.DictReader(file, skipinitialspace=True)
             for row in reader:
                 cursor.execute(
-                    "INSERT INTO items (name, rarity, desc, effect) VALUES (?, ?, ?, ?)",
-                    (row['name'], row['rarity'], row['desc'], row['effect'])
+                    "INSERT OR IGNORE INTO items (name, rarity_code, desc, effect) VALUES (?, ?, ?, ?)",
+                    (row['name'].strip(), self.get_rarity_code(cursor, row['rarity'].strip()),
+                     row['desc'].strip(), row['effect'].strip())
                 )
-                imported_count += 1
+                imported_count += cursor.rowcount
 
         conn.commit()
         conn.close()
@@ -130,9 +766,9 @@ class DatabaseManager:
 
     def export_to_csv(self, csv_path):
         # экспортирует предметы в csv файл
-        conn = sqlite3.connect(self.db_path)
+        conn = self.get_connection()
         cursor = conn.cursor()
-        cursor.execute("SELECT name, rarity, desc, effect FROM items")
+        cursor.execute(self.ITEMS_SELECT)
         items_data = cursor.fetchall()
         conn.close()
 
@@ -140,24 +776,498 @@ class DatabaseManager:
             writer = csv.writer(file)
             writer.writerow(['name', 'rarity', 'desc', 'effect'])
             for item in items_data:
-                writer.writerow(item)
+                writer.writerow(item[1:])
 
         return len(items_data)
 
 
+class StorageMaintenance:
+    # обслуживание файла базы: вакуум, статистика, ANALYZE/optimize, проверка целостности
+    # все методы блокирующие, из интерфейса вызываются в фоновом потоке (MaintenanceThread)
+
+    # очистки каталога здесь нет: из чужого потока она прошла бы мимо памяти приложения,
+    # приложение очищает каталог через очередь записи (изменение "clear")
+    TASKS = ("enable_incremental_vacuum", "incremental_vacuum", "vacuum",
+             "analyze", "optimize", "integrity_check")
+
+    def __init__(self, db_manager):
+        self.db_manager = db_manager
+
+    def get_connection(self):
+        # pragma вакуума нельзя выполнять внутри транзакции
+        conn = self.db_manager.get_connection()
+        conn.isolation_level = None
+        return conn
+
+    def get_stats(self):
+        # размер файла, страницы, свободные страницы и доля фрагментации
+        conn = self.get_connection()
+        page_size = conn.execute("PRAGMA page_size").fetchone()[0]
+        page_count = conn.execute("PRAGMA page_count").fetchone()[0]
+        free_pages = conn.execute("PRAGMA freelist_count").fetchone()[0]
+        auto_vacuum = conn.execute("PRAGMA auto_vacuum").fetchone()[0]
+        conn.close()
+
+        file_size = os.path.getsize(self.db_manager.db_path)
+        wal_path = self.db_manager.db_path + "-wal"
+        if os.path.exists(wal_path):
+            file_size += os.path.getsize(wal_path)
+
+        return {
+            "file_size": file_size,
+            "page_size": page_size,
+            "page_count": page_count,
+            "free_pages": free_pages,
+            "fragmentation": free_pages / page_count if page_count else 0.0,
+            "auto_vacuum": {0: "none", 1: "full", 2: "incremental"}.get(auto_vacuum, str(auto_vacuum)),
+        }
+
+    def enable_incremental_vacuum(self):
+        # старые базы созданы без auto_vacuum, режим включается одним полным VACUUM
+        conn = self.get_connection()
+        if conn.execute("PRAGMA auto_vacuum").fetchone()[0] != 2:
+            conn.execute("PRAGMA auto_vacuum = INCREMENTAL")
+            conn.execute("VACUUM")
+        conn.close()
+
+    def incremental_vacuum(self, max_pages=0):
+        # возвращает свободные страницы системе, 0 - все
+        conn = self.get_connection()
+        conn.execute(f"PRAGMA incremental_vacuum({int(max_pages)})").fetchall()
+        conn.close()
+
+    def vacuum(self, page_size=None):
+        # полная пересборка файла, заодно может сменить размер страницы
+        conn = self.get_connection()
+        if page_size:
+            conn.execute(f"PRAGMA page_size = {int(page_size)}")
+        conn.execute("VACUUM")
+        conn.close()
+
+    def analyze(self):
+        conn = self.get_connection()
+        conn.execute("ANALYZE")
+        conn.close()
+
+    def optimize(self):
+        # дешевый вариант ANALYZE: sqlite сам решает, какую статистику обновить
+        conn = self.get_connection()
+        conn.execute("PRAGMA optimize")
+        conn.close()
+
+    def integrity_check(self, quick=True):
+        # возвращает список проблем, пустой если база в порядке
+        conn = self.get_connection()
+        pragma = "quick_check" if quick else "integrity_check"
+        messages = [row[0] for row in conn.execute(f"PRAGMA {pragma}")]
+        conn.close()
+        return [] if messages == ["ok"] else messages
+
+    def run(self, tasks, page_size=None):
+        # выполняет задачи по порядку и возвращает отчет со статистикой до и после
+        report = {"before": self.get_stats(), "tasks": [], "problems": []}
+        for task in tasks:
+            start = time.perf_counter()
+            if task == "vacuum":
+                self.vacuum(page_size)
+            elif task == "integrity_check":
+                report["problems"] = self.integrity_check()
+            elif task in self.TASKS:
+                getattr(self, task)()
+            else:
+                raise ValueError(f"неизвестная задача обслуживания: {task}")
+            report["tasks"].append((task, time.perf_counter() - start))
+        report["after"] = self.get_stats()
+        return report
+
+    @staticmethod
+    def format_report(report):
+        # текстовый отчет для окна сообщения и консоли
+        def describe(stats):
+            return (f"{stats['file_size'] / 1024:.0f} КБ, страниц {stats['page_count']} "
+                    f"по {stats['page_size']} Б, свободных {stats['free_pages']} "
+                    f"({stats['fragmentation']:.1%}), auto_vacuum: {stats['auto_vacuum']}")
+
+        lines = [f"До: {describe(report['before'])}", f"После: {describe(report['after'])}"]
+        lines.extend(f"{task}: {seconds * 1000:.0f} мс" for task, seconds in report["tasks"])
+        if any(task == "integrity_check" for task, _ in report["tasks"]):
+            lines.append("Целостность: " + ("в порядке" if not report["problems"]
+                                            else "; ".join(report["problems"][:5])))
+        return "\n".join(lines)
+
+
+class WriteBehindQueue:
+    # очередь отложенной записи: изменения сразу применяются в памяти,
+    # а в sqlite уходят пачками одной транзакцией из фонового потока
+    #
+    # изменения - кортежи:
+    #   ("add", item), ("delete", item), ("clear", items), ("restore", items),
+    #   ("update", item, старые значения, новые значения)
+
+    def __init__(self, db_manager, max_batch=100, max_delay=0.5, retry_delay=0.5, max_retry_delay=30.0):
+        self.db_manager = db_manager
+        self.max_batch = max_batch  # сброс по количеству изменений
+        self.max_delay = max_delay  # сброс по времени (секунды) с первого изменения в пачке
+        self.retry_delay = retry_delay  # первая пауза перед повтором, дальше удваивается
+        self.max_retry_delay = max_retry_delay
+        self.pending = []
+        self.first_pending_time = None
+        self.in_flight = False
+        self.errors = []  # изменения, отвергнутые базой (нарушение ограничений)
+        self.retries = 0  # неудачных попыток подряд
+        self.retry_at = None  # время следующей попытки после ошибки
+        self.retry_error = None
+        self.paused = False  # запись приостановлена (обслуживание базы)
+        self.closed = False
+        self.condition = threading.Condition()
+        self.write_lock = threading.Lock()  # сохраняет порядок пачек между потоками
+        self.thread = threading.Thread(target=self.run, name="write-behind", daemon=True)
+        self.thread.start()
+
+    def put(self, mutations):
+        # ставит изменения в очередь
+        with self.condition:
+            if not self.pending:
+                self.first_pending_time = time.monotonic()
+            self.pending.extend(mutations)
+            self.condition.notify()
+
+    def has_pending(self):
+        # есть ли изменения, еще не записанные в базу
+        with self.condition:
+            return bool(self.pending) or self.in_flight
+
+    def take_errors(self):
+        # возвращает и очищает ошибки записи (вызывается из потока интерфейса)
+        with self.condition:
+            errors, self.errors = self.errors, []
+        return errors
+
+    def get_retry_error(self):
+        # причина, по которой изменения ждут записи, или None
+        with self.condition:
+            if self.retry_error is None and self.paused and (self.pending or self.in_flight):
+                return "запись приостановлена на время обслуживания базы"
+            return self.retry_error
+
+    def pause(self):
+        # приостанавливает запись (VACUUM держит эксклюзивную блокировку); не ждет текущую пачку,
+        # ее дожидается поток обслуживания через write_pending(force=True)
+        with self.condition:
+            self.paused = True
+
+    def resume(self):
+        with self.condition:
+            self.paused = False
+            self.condition.notify()
+
+    def write_pending(self, force=False):
+        # записывает все накопленные изменения одной транзакцией
+        # возвращает False, если база занята (или запись на паузе) и изменения остались в очереди
+        # force - записать и на паузе (поток обслуживания перед своими задачами)
+        with self.condition:
+            if self.paused and not force:
+                return not self.pending and not self.in_flight
+        with self.write_lock:
+            with self.condition:
+                batch, self.pending = self.pending, []
+                self.in_flight = bool(batch)
+            if not batch:
+                return True
+            try:
+                errors = self.db_manager.apply_mutations(batch)
+            except sqlite3.IntegrityError as e:
+                errors = [(mutation, e) for mutation in batch]
+            except sqlite3.Error as e:
+                # база заблокирована или недоступна: транзакция откатилась целиком,
+                # пачка возвращается в начало очереди и повторяется с растущей паузой
+                with self.condition:
+                    self.pending[:0] = batch
+                    self.in_flight = False
+                    self.retries += 1
+                    self.retry_error = e
+                    self.retry_at = time.monotonic() + min(
+                        self.max_retry_delay, self.retry_delay * 2 ** (self.retries - 1))
+                return False
+            with self.condition:
+                self.errors.extend(errors)
+                self.in_flight = False
+                self.retries = 0
+                self.retry_error = None
+                self.retry_at = None
+            return True
+
+    def run(self):
+        # фоновый поток: ждет порога по количеству или по времени, после ошибки - паузы повтора
+        while True:
+            with self.condition:
+                while (not self.pending or self.paused) and not self.closed:
+                    self.condition.wait()
+                if self.closed:
+                    return
+                while not self.closed and not self.paused:
+                    if self.retry_at is not None:
+                        deadline = self.retry_at
+                    elif len(self.pending) < self.max_batch:
+                        deadline = self.first_pending_time + self.max_delay
+                    else:
+                        break
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self.condition.wait(remaining)
+            self.write_pending()
+
+    def flush(self):
+        # синхронно записывает все, что накопилось; False - изменения остались в очереди
+        return self.write_pending()
+
+    def close(self):
+        # останавливает фоновый поток и делает последнюю попытку записи
+        # False - база занята, изменения все еще в очереди (можно повторить через flush)
+        with self.condition:
+            self.closed = True
+            self.condition.notify()
+        self.thread.join()
+        return self.write_pending()
+
+
+class UndoJournal:
+    # ограниченный журнал отмены/повтора, каждая запись - пачка изменений одного действия
+
+    def __init__(self, max_size=100):
+        self.undo_stack = deque(maxlen=max_size)
+        self.redo_stack = []
+
+    @staticmethod
+    def invert(mutations):
+        # возвращает пачку изменений, отменяющую переданную
+        inverse = []
+        for mutation in reversed(mutations):
+            op = mutation[0]
+            if op == "add":
+                inverse.append(("delete", mutation[1]))
+            elif op == "delete":
+                inverse.append(("add", mutation[1]))
+            elif op == "clear":
+                inverse.append(("restore", mutation[1]))
+            elif op == "restore":
+                inverse.append(("clear", mutation[1]))
+            elif op == "update":
+                inverse.append(("update", mutation[1], mutation[3], mutation[2]))
+        return inverse
+
+    def record(self, mutations):
+        # запоминает новое действие, история повтора при этом сбрасывается
+        self.undo_stack.append(mutations)
+        self.redo_stack.clear()
+
+    def undo(self):
+        # возвращает пачку для отмены последнего действия или None
+        if not self.undo_stack:
+            return None
+        mutations = self.undo_stack.pop()
+        self.redo_stack.append(mutations)
+        return self.invert(mutations)
+
+    def redo(self):
+        # возвращает пачку для повтора отмененного действия или None
+        if not self.redo_stack:
+            return None
+        mutations = self.redo_stack.pop()
+        self.undo_stack.append(mutations)
+        return mutations
+
+    def discard(self, items):
+        # убирает из истории действия с предметами, изменения которых база отвергла
+        ids = {id(item) for item in items}
+
+        def touches(mutations):
+            for mutation in mutations:
+                targets = mutation[1] if mutation[0] in ("clear", "restore") else [mutation[1]]
+                if any(id(item) in ids for item in targets):
+                    return True
+            return False
+
+        self.undo_stack = deque((m for m in self.undo_stack if not touches(m)), maxlen=self.undo_stack.maxlen)
+        self.redo_stack = [m for m in self.redo_stack if not touches(m)]
+
+    def clear(self):
+        self.undo_stack.clear()
+        self.redo_stack.clear()
+
+
+class MaintenanceThread(QThread):
+    # выполняет обслуживание базы в фоне, чтобы не блокировать интерфейс
+
+    report_ready = pyqtSignal(dict)
+    failed = pyqtSignal(str)
+
+    def __init__(self, db_manager, tasks, page_size=None, write_queue=None, parent=None):
+        super().__init__(parent)
+        self.maintenance = StorageMaintenance(db_manager)
+        self.tasks = tasks
+        self.page_size = page_size  # новый размер страницы для задачи vacuum
+        self.write_queue = write_queue  # приостановленная очередь записи приложения
+
+    def run(self):
+        try:
+            # вакууму нужна база без наших незаписанных изменений; запись (и ожидание
+            # занятой базы) идет здесь, а не в потоке интерфейса
+            if self.write_queue is not None:
+                self.write_queue.write_pending(force=True)
+            self.report_ready.emit(self.maintenance.run(self.tasks, self.page_size))
+        except sqlite3.Error as e:
+            self.failed.emit(str(e))
+
+
+class ItemLoaderThread(QThread):
+    # читает каталог в фоне, пустую базу заполняет демо данными
+
+    loaded = pyqtSignal(list, int)  # предметы и seq журнала, с которого начинать синхронизацию
+    failed = pyqtSignal(str)
+
+    def __init__(self, db_manager, demo_items, parent=None):
+        super().__init__(parent)
+        self.db_manager = db_manager
+        self.demo_items = demo_items
+
+    def run(self):
+        try:
+            # seq берем до чтения: изменения между ними просто применятся повторно
+            seq = self.db_manager.register_reader()
+            items = self.db_manager.get_all_items()
+
+            # если база пустая, сохраняем демо данные одной транзакцией
+            if not items:
+                self.db_manager.add_items(self.demo_items)
+                items = self.demo_items
+                seq = self.db_manager.get_last_change_seq()
+
+            self.loaded.emit(items, seq)
+        except Exception as e:
+            self.failed.emit(str(e))
+
+
+class LootRoller:
+    # пакетные броски лута для баланса: без виджетов, воспроизводимо по сиду
+    # бросок - roll_size разных предметов, как в LootGeneratorDialog;
+    # броски хранятся плоским array('I') индексов в снимке предметов, упорядоченном по id,
+    # поэтому результат задают сид и версия каталога (набор предметов), а не порядок в памяти
+
+    CHUNK_SIZE = 10000  # бросков в пачке; от него зависит последовательность, поэтому константа
+
+    def __init__(self, items, roll_size=5, seed=None):
+        self.items = self.stable_order(items)
+        self.roll_size = min(roll_size, len(items))
+        self.seed = seed
+
+    @staticmethod
+    def stable_order(items):
+        # свой снимок по возрастанию id: порядок списка приложения меняется за сессию
+        # (отмена удаления и синхронизация добавляют в конец); несохраненные - в конце
+        return sorted(items, key=lambda x: (x.id is None, x.id or 0))
+
+    def iter_chunks(self, count):
+        # генерирует броски пачками
+        # индексы тянутся с возвращением одним вызовом choices, а редкие броски с повтором
+        # перебрасываются через sample - распределение то же, что у random.sample
+        rnd = random.Random(self.seed)
+        population = range(len(self.items))
+        roll_size = self.roll_size
+        # на маленьком каталоге повторы часты, там сразу sample
+        fast = len(population) >= roll_size * 8
+        for start in range(0, count, self.CHUNK_SIZE):
+            rolls_in_chunk = min(self.CHUNK_SIZE, count - start)
+            if fast:
+                chunk = array('I', rnd.choices(population, k=rolls_in_chunk * roll_size))
+                for offset in range(0, len(chunk), roll_size):
+                    if len(set(chunk[offset:offset + roll_size])) < roll_size:
+                        chunk[offset:offset + roll_size] = array('I', rnd.sample(population, roll_size))
+            else:
+                chunk = array('I')
+                for _ in range(rolls_in_chunk):
+                    chunk.extend(rnd.sample(population, roll_size))
+            yield chunk
+
+    def roll(self, count):
+        # все броски одним массивом
+        rolls = array('I')
+        for chunk in self.iter_chunks(count):
+            rolls.extend(chunk)
+        return rolls
+
+    def count_by_rarity(self, rolls, counts=None):
+        # сколько раз выпала каждая редкость (можно накапливать по пачкам)
+        counts = counts if counts is not None else {}
+        for index, times in Counter(rolls).items():
+            rarity = self.items[index].rarity
+            counts[rarity] = counts.get(rarity, 0) + times
+        return counts
+
+    def write_csv(self, path, chunks):
+        # пишет броски построчно (бросок, слот, название, редкость), возвращает счетчик редкостей
+        # "название,редкость" каждого предмета экранируется csv один раз, а не на каждой строке
+        buffer = io.StringIO()
+        writer = csv.writer(buffer, lineterminator="")
+        encoded = []
+        for item in self.items:
+            writer.writerow([item.name, item.rarity])
+            encoded.append(buffer.getvalue())
+            buffer.seek(0)
+            buffer.truncate()
+
+        roll_size = self.roll_size
+        counts = {}
+        roll_number = 0
+        with open(path, 'w', encoding='utf-8', newline='') as file:
+            file.write("roll,slot,name,rarity\r\n")
+            for chunk in chunks:
+                lines = []
+                for start in range(0, len(chunk), roll_size):
+                    roll_number += 1
+                    for slot, index in enumerate(chunk[start:start + roll_size], 1):
+                        lines.append(f"{roll_number},{slot},{encoded[index]}\r\n")
+                file.writelines(lines)
+                self.count_by_rarity(chunk, counts)
+        return counts
+
+    def write_jsonl(self, path, chunks):
+        # пишет по одному броску в строке: {"roll": n, "items": [[название, редкость], ...]}
+        # json каждого предмета готовится один раз, а не для каждого броска
+        encoded = [json.dumps([item.name, item.rarity], ensure_ascii=False) for item in self.items]
+        roll_size = self.roll_size
+        counts = {}
+        roll_number = 0
+        with open(path, 'w', encoding='utf-8') as file:
+            for chunk in chunks:
+                lines = []
+                for start in range(0, len(chunk), roll_size):
+                    roll_number += 1
+                    loot = ", ".join([encoded[index] for index in chunk[start:start + roll_size]])
+                    lines.append(f'{{"roll": {roll_number}, "items": [{loot}]}}\n')
+                file.writelines(lines)
+                self.count_by_rarity(chunk, counts)
+        return counts
+
+    def split_chunks(self, rolls):
+        # режет готовый массив бросков на пачки для потоковой записи
+        step = self.CHUNK_SIZE * self.roll_size
+        return (rolls[start:start + step] for start in range(0, len(rolls), step))
+
+
 class ItemDialog(QDialog):
     # диалог добавления и редактирования предмета
 
+    RARITIES = ["Обычный", "Необычный", "Легендарный", "Босс", "Лунный", "Снаряжение", "Бездонный"]
+
     def __init__(self, parent=None, item=None):
         super().__init__(parent)
-        self.item = item
+        self.item = None
         self.init_ui()
-
-        if item:
-            self.load_item_data()
+        self.set_item(item)
 
     def init_ui(self):
-        self.setWindowTitle("Добавить предмет" if not self.item else "Редактировать предмет")
         self.setFixedSize(500, 350)
 
         layout = QVBoxLayout()
@@ -167,7 +1277,7 @@ class ItemDialog(QDialog):
 
         self.name_edit = QLineEdit()
         self.rarity_combo = QComboBox()
-        self.rarity_combo.addItems(["Обычный", "Необычный", "Легендарный", "Босс", "Лунный", "Снаряжение", "Бездонный"])
+        self.rarity_combo.addItems(self.RARITIES)
 
         self.desc_edit = QTextEdit()
         self.desc_edit.setMaximumHeight(60)
@@ -195,10 +1305,30 @@ class ItemDialog(QDialog):
 
         self.setLayout(layout)
 
+    def set_item(self, item):
+        # перенастраивает уже построенный диалог: item=None - добавление, иначе редактирование
+        self.item = item
+        self.setWindowTitle("Добавить предмет" if not item else "Редактировать предмет")
+        # нестандартная редкость прошлого предмета убирается из списка, выбор сбрасывается
+        while self.rarity_combo.count() > len(self.RARITIES):
+            self.rarity_combo.removeItem(self.rarity_combo.count() - 1)
+        self.rarity_combo.setCurrentIndex(0)
+        if item:
+            self.load_item_data()
+        else:
+            self.name_edit.clear()
+            self.desc_edit.clear()
+            self.effect_edit.clear()
+        self.name_edit.setFocus()
+
     def load_item_data(self):
         # загружает данные предмета в форму
         if self.item:
             self.name_edit.setText(self.item.name)
+            # редкость не из стандартного списка (например из импорта csv) добавляется в список,
+            # иначе сохранение молча заменило бы ее выбранной ранее
+            if self.rarity_combo.findText(self.item.rarity) < 0:
+                self.rarity_combo.addItem(self.item.rarity)
             self.rarity_combo.setCurrentText(self.item.rarity)
             self.desc_edit.setPlainText(self.item.desc)
             self.effect_edit.setPlainText(self.item.effect)
@@ -215,45 +1345,43 @@ class ItemDialog(QDialog):
 
 class ItemDetailsDialog(QDialog):
     # диалог отображения полной информации о предмете
+    # строится один раз, при повторном показе меняется только содержимое (set_item)
 
     def __init__(self, item, parent=None):
         super().__init__(parent)
-        self.item = item
+        self.item = None
+        self.rarity_color = None  # цвет, под который собраны стили заголовка
         self.init_ui()
+        self.set_item(item)
 
     def init_ui(self):
-        self.setWindowTitle(f"Детали: {self.item.name}")
         self.setFixedSize(450, 350)
 
         layout = QVBoxLayout()
 
-        # заголовок с названием и редкостью предмета
+        # заголовок с названием и редкостью предмета, цвет стилей задает set_item
         header_layout = QHBoxLayout()
-        name_label = QLabel(self.item.name)
-        name_label.setStyleSheet(f"font-size: 18px; font-weight: bold; color: {self.item.get_rarity_color().name()};")
-
-        rarity_label = QLabel(self.item.rarity)
-        rarity_label.setStyleSheet(
-            f"font-size: 14px; color: {self.item.get_rarity_color().name()}; padding: 5px; border: 1px solid {self.item.get_rarity_color().name()}; border-radius: 10px;")
+        self.name_label = QLabel()
+        self.rarity_label = QLabel()
 
-        header_layout.addWidget(name_label)
+        header_layout.addWidget(self.name_label)
         header_layout.addStretch()
-        header_layout.addWidget(rarity_label)
+        header_layout.addWidget(self.rarity_label)
 
         # информация о предмете
         info_group = QGroupBox("Информация о предмете")
         info_layout = QFormLayout()
 
-        desc_label = QLabel(self.item.desc)
-        desc_label.setWordWrap(True)
-        desc_label.setStyleSheet("padding: 5px;")
+        self.desc_label = QLabel()
+        self.desc_label.setWordWrap(True)
+        self.desc_label.setStyleSheet("padding: 5px;")
 
-        effect_label = QLabel(self.item.effect)
-        effect_label.setWordWrap(True)
-        effect_label.setStyleSheet("padding: 5px; background-color: #2d2d2d; color: white; border-radius: 5px;")
+        self.effect_label = QLabel()
+        self.effect_label.setWordWrap(True)
+        self.effect_label.setStyleSheet("padding: 5px; background-color: #2d2d2d; color: white; border-radius: 5px;")
 
-        info_layout.addRow("Описание:", desc_label)
-        info_layout.addRow("Эффект:", effect_label)
+        info_layout.addRow("Описание:", self.desc_label)
+        info_layout.addRow("Эффект:", self.effect_label)
 
         info_group.setLayout(info_layout)
 
@@ -268,19 +1396,64 @@ class ItemDetailsDialog(QDialog):
 
         self.setLayout(layout)
 
+    def set_item(self, item, title=None):
+        # показывает другой предмет в уже построенном диалоге
+        self.item = item
+        self.setWindowTitle(title or f"Детали: {item.name}")
+        self.name_label.setText(item.name)
+        self.rarity_label.setText(item.rarity)
+        self.desc_label.setText(item.desc)
+        self.effect_label.setText(item.effect)
+
+        # разбор стилей дорогой, пересобираем их только при смене цвета редкости
+        color = item.get_rarity_color().name()
+        if color != self.rarity_color:
+            self.rarity_color = color
+            self.name_label.setStyleSheet(f"font-size: 18px; font-weight: bold; color: {color};")
+            self.rarity_label.setStyleSheet(
+                f"font-size: 14px; color: {color}; padding: 5px; border: 1px solid {color}; border-radius: 10px;")
+
+
+class LootRollsModel(QAbstractListModel):
+    # виртуальный список бросков: текст строки собирается только для видимых строк
+
+    def __init__(self, items, parent=None):
+        super().__init__(parent)
+        self.items = items
+        self.rolls = array('I')
+        self.roll_size = 1
+
+    def set_rolls(self, rolls, roll_size):
+        self.beginResetModel()
+        self.rolls = rolls
+        self.roll_size = max(roll_size, 1)
+        self.endResetModel()
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.rolls) // self.roll_size
+
+    def data(self, index, role=Qt.ItemDataRole.DisplayRole):
+        if not index.isValid() or role != Qt.ItemDataRole.DisplayRole:
+            return None
+        start = index.row() * self.roll_size
+        names = ", ".join(self.items[i].name for i in self.rolls[start:start + self.roll_size])
+        return f"#{index.row() + 1}: {names}"
+
 
 class LootGeneratorDialog(QDialog):
     # диалог для генерации рандомного лута
 
     def __init__(self, items, parent=None):
         super().__init__(parent)
-        self.items = items
+        # снимок каталога: синхронизация меняет список приложения прямо во время exec(),
+        # а модель бросков и экспорт хранят индексы в этом списке; порядок - как у LootRoller
+        self.items = LootRoller.stable_order(items)
         self.init_ui()
         self.generate_loot()
 
     def init_ui(self):
         self.setWindowTitle("Генератор лута - Режим игры")
-        self.setFixedSize(900, 500)
+        self.setFixedSize(900, 800)
 
         layout = QVBoxLayout()
 
@@ -302,17 +1475,64 @@ class LootGeneratorDialog(QDialog):
         button_layout.addWidget(self.generate_btn)
         button_layout.addWidget(self.close_btn)
 
+        # массовые броски для баланса: без виджетов на предмет, список виртуальный
+        batch_group = QGroupBox("Массовые броски")
+        batch_layout = QVBoxLayout()
+        controls_layout = QHBoxLayout()
+
+        self.rolls_spin = QSpinBox()
+        self.rolls_spin.setRange(1, 10000000)
+        self.rolls_spin.setSingleStep(1000)
+        self.rolls_spin.setValue(10000)
+
+        self.seed_edit = QLineEdit()
+        self.seed_edit.setPlaceholderText("пусто - случайный")
+
+        self.batch_btn = QPushButton("🎲 Бросить")
+        self.batch_btn.clicked.connect(self.generate_batch)
+        self.export_csv_btn = QPushButton("Экспорт CSV")
+        self.export_csv_btn.clicked.connect(lambda: self.export_batch("csv"))
+        self.export_jsonl_btn = QPushButton("Экспорт JSONL")
+        self.export_jsonl_btn.clicked.connect(lambda: self.export_batch("jsonl"))
+        self.export_csv_btn.setEnabled(False)
+        self.export_jsonl_btn.setEnabled(False)
+
+        controls_layout.addWidget(QLabel("Бросков:"))
+        controls_layout.addWidget(self.rolls_spin)
+        controls_layout.addWidget(QLabel("Сид:"))
+        controls_layout.addWidget(self.seed_edit)
+        controls_layout.addWidget(self.batch_btn)
+        controls_layout.addWidget(self.export_csv_btn)
+        controls_layout.addWidget(self.export_jsonl_btn)
+
+        self.rolls_model = LootRollsModel(self.items, self)
+        self.rolls_view = QListView()
+        self.rolls_view.setModel(self.rolls_model)
+        self.rolls_view.setUniformItemSizes(True)
+
+        self.stats_label = QLabel("Статистика по редкостям появится после бросков")
+        self.stats_label.setWordWrap(True)
+
+        batch_layout.addLayout(controls_layout)
+        batch_layout.addWidget(self.rolls_view)
+        batch_layout.addWidget(self.stats_label)
+        batch_group.setLayout(batch_layout)
+
+        self.roller = None
+        self.rolls = array('I')
+
         layout.addWidget(title_label)
         layout.addLayout(self.items_layout)
         layout.addLayout(button_layout)
+        layout.addWidget(batch_group)
 
         self.setLayout(layout)
 
     def generate_loot(self):
         # генерирует случайный набор из 5 предметов
-        # сначала очищаем предыдущие предметы
-        for i in reversed(range(self.items_layout.count())):
-            widget = self.items_layout.itemAt(i).widget()
+        # сначала очищаем предыдущие предметы и отступы
+        while self.items_layout.count():
+            widget = self.items_layout.takeAt(0).widget()
             if widget:
                 widget.deleteLater()
 
@@ -329,6 +1549,57 @@ class LootGeneratorDialog(QDialog):
         # отступы по бокам
         self.items_layout.addStretch()
 
+    def generate_batch(self):
+        # генерирует N бросков сразу, сид показывается в поле для воспроизводимости
+        seed_text = self.seed_edit.text().strip()
+        if not seed_text:
+            seed_text = str(random.randrange(2 ** 32))
+            self.seed_edit.setText(seed_text)
+        seed = int(seed_text) if seed_text.lstrip("-").isdigit() else seed_text
+
+        count = self.rolls_spin.value()
+        self.roller = LootRoller(self.items, seed=seed)
+        QApplication.setOverrideCursor(Qt.CursorShape.WaitCursor)
+        try:
+            start = time.perf_counter()
+            self.rolls = self.roller.roll(count)
+            counts = self.roller.count_by_rarity(self.rolls)
+            elapsed = time.perf_counter() - start
+        finally:
+            QApplication.restoreOverrideCursor()
+
+        self.rolls_model.set_rolls(self.rolls, self.roller.roll_size)
+        self.export_csv_btn.setEnabled(True)
+        self.export_jsonl_btn.setEnabled(True)
+
+        total = sum(counts.values()) or 1
+        ordered = sorted(counts.items(), key=lambda pair: Item.RARITY_ORDER.get(pair[0], len(Item.RARITY_ORDER)))
+        stats = ", ".join(f"{rarity}: {times} ({times / total:.1%})" for rarity, times in ordered)
+        self.stats_label.setText(f"{count} бросков за {elapsed:.2f} с. {stats}")
+
+    def export_batch(self, file_format):
+        # потоково пишет текущие броски в csv или jsonl
+        if self.roller is None:
+            return
+        file_path, _ = QFileDialog.getSaveFileName(
+            self, "Экспорт бросков", f"loot_rolls_{self.seed_edit.text()}.{file_format}",
+            "CSV Files (*.csv)" if file_format == "csv" else "JSON Lines (*.jsonl)"
+        )
+        if not file_path:
+            return
+
+        QApplication.setOverrideCursor(Qt.CursorShape.WaitCursor)
+        try:
+            chunks = self.roller.split_chunks(self.rolls)
+            if file_format == "csv":
+                self.roller.write_csv(file_path, chunks)
+            else:
+                self.roller.write_jsonl(file_path, chunks)
+        except OSError as e:
+            QMessageBox.critical(self, "Ошибка", f"Не удалось сохранить броски: {str(e)}")
+        finally:
+            QApplication.restoreOverrideCursor()
+
     def create_item_widget(self, item):
         # делает виджет отображения предмета
         widget = QFrame()
@@ -339,7 +1610,7 @@ class LootGeneratorDialog(QDialog):
             border-radius: 12px; 
             padding: 12px;
             background-color: #2d2d2d;
-            margin: 5px;  # добавил отступ между ячейками
+            margin: 5px;  /* добавил отступ между ячейками */
         """)
 
         layout = QVBoxLayout()
@@ -369,7 +1640,7 @@ class LootGeneratorDialog(QDialog):
         name_label.setStyleSheet(f"""
             font-weight: bold; 
             color: {item.get_rarity_color().name()}; 
-            font-size: 11px;  # уменьшил шрифт названия
+            font-size: 11px;  /* уменьшил шрифт названия */
             margin: 5px;
             padding: 5px;
         """)
@@ -403,16 +1674,43 @@ class LootGeneratorDialog(QDialog):
 class ItempediaApp(QMainWindow):
     # главное окно приложения itempedia
 
-    def __init__(self):
+    IDLE_MAINTENANCE_MS = 120000  # простой перед фоновыми optimize и инкрементальным вакуумом
+
+    def __init__(self, db_path="items.db", started=None):
         super().__init__()
+        # время старта для замера запуска (в main берется до создания QApplication)
+        self.startup_started = started if started is not None else time.perf_counter()
+        self.startup_timings = {}  # этап запуска -> мс от старта
         self.items = []
-        self.filtered_items = []
+        self.filtered_items = ItemView(self.items)
+        self.id_pool = IdPool()  # id сохраненных предметов для предмета дня
         self.item_of_the_day = None
-        self.db_manager = DatabaseManager()  # менеджер базы данных
+        self.db_manager = DatabaseManager(db_path)  # менеджер базы данных
+        self.item_filter = ItemFilter()  # движок инкрементальной фильтрации
+        self.maintenance_thread = None  # текущее фоновое обслуживание базы
+        self.last_sync_seq = 0  # последняя примененная запись журнала изменений
+        self.reload_needed = False  # память разошлась с базой, перечитать при первой возможности
+        self.write_queue = WriteBehindQueue(self.db_manager)  # отложенная запись в базу
+        self.undo_journal = UndoJournal()  # журнал отмены/повтора
+        self.loader_thread = None  # фоновая загрузка каталога
+        self.item_dialog = None  # диалоги создаются при первом открытии и переиспользуются
+        self.details_dialog = None
         self.init_ui()
-        self.load_items()
-        self.update_item_of_the_day()
-        self.apply_dark_theme()
+        self.apply_dark_theme()  # палитра до первой отрисовки, иначе окно перерисуется
+
+        # загрузка и предмет дня - после показа окна, пока окно неактивно
+        self.set_loading(True)
+        QTimer.singleShot(0, self.load_items)
+
+        # опрашиваем базу на изменения из других процессов (запускается после загрузки)
+        self.sync_timer = QTimer(self)
+        self.sync_timer.timeout.connect(self.sync_external_changes)
+
+        # легкое обслуживание базы после простоя, перезапускается при каждом действии
+        self.idle_timer = QTimer(self)
+        self.idle_timer.setSingleShot(True)
+        self.idle_timer.timeout.connect(self.run_idle_maintenance)
+        self.idle_timer.start(self.IDLE_MAINTENANCE_MS)
 
     def init_ui(self):
         # инициализация пользовательского интерфейса
@@ -525,22 +1823,9 @@ class ItempediaApp(QMainWindow):
             )
 
             if reply == QMessageBox.StandardButton.Yes:
-                # удаляем из базы данных
-                self.db_manager.delete_item(item)
-
-                # удаляем из локальных списков
-                if item in self.items:
-                    self.items.remove(item)
-                if item in self.filtered_items:
-                    self.filtered_items.remove(item)
-
-                # обновляем таблицу
-                self.update_items_table()
-
-                # обновляем предмет дня
-                self.update_item_of_the_day()
-
-                self.statusBar().showMessage(f"Удален предмет: {item.name}")
+                # удаляем из памяти сразу, из базы - в фоне
+                self.apply_mutations([("delete", item)])
+                self.statusBar().showMessage(f"Удален предмет: {item.name} (Ctrl+Z - отменить)")
         else:
             QMessageBox.warning(self, "Ошибка", "Неверный выбор предмета!")
 
@@ -550,30 +1835,82 @@ class ItempediaApp(QMainWindow):
         if current_row >= 0 and current_row < len(self.filtered_items):
             item = self.filtered_items[current_row]
 
-            #находим ориг. предмет
-            original_item = None
-            for orig_item in self.items_list:
-                if (orig_item.name == item.name and
-                        orig_item.rarity == item.rarity and
-                        orig_item.desc == item.desc):
-                    original_item = orig_item
-                    break
-            if original_item:
-                dialog = ItemDialog(self, original_item)
-                if dialog.exec():
-                    item_data = dialog.get_item_data()
-
-                    # обновляем данные предмета
-                    original_item.name = item_data['name']
-                    original_item.rarity = item_data['rarity']
-                    original_item.desc = item_data['desc']
-                    original_item.effect = item_data['effect']
-
-                    self.save_items()
-                    self.filter_items()
-                    self.statusBar().showMessage(f"Обновлен предмет:{original_item.name}")
-                else:
-                    QMessageBox.warning(self, "Внимание", "Выберите предмет для редактирования")
+            dialog = self.get_item_dialog(item)
+            if dialog.exec():
+                item_data = dialog.get_item_data()
+
+                if not item_data['name']:
+                    QMessageBox.warning(self, "Ошибка", "Название предмета обязательно!")
+                    return
+                if self.find_item(item_data['name'], item_data['rarity'], exclude=item):
+                    QMessageBox.warning(self, "Ошибка", "Предмет с таким названием и редкостью уже существует!")
+                    return
+
+                # обновляем данные предмета
+                new_values = (item_data['name'], item_data['rarity'], item_data['desc'], item_data['effect'])
+                self.apply_mutations([("update", item, item.get_values(), new_values)])
+                self.statusBar().showMessage(f"Обновлен предмет: {item.name}")
+        else:
+            QMessageBox.warning(self, "Внимание", "Выберите предмет для редактирования")
+
+    def find_item(self, name, rarity, exclude=None):
+        # ищет предмет по естественному ключу (название + редкость)
+        for item in self.items:
+            if item is not exclude and item.name == name and item.rarity == rarity:
+                return item
+        return None
+
+    def apply_mutations(self, mutations, record=True):
+        # применяет изменения к списку в памяти и ставит их в очередь записи в базу
+        for mutation in mutations:
+            op = mutation[0]
+            if op == "add":
+                self.items.append(mutation[1])
+                if mutation[1].id is not None:  # отмена удаления возвращает прежний id
+                    self.id_pool.add(mutation[1].id)
+            elif op == "delete":
+                if mutation[1] in self.items:
+                    self.items.remove(mutation[1])
+                if mutation[1].id is not None:
+                    self.id_pool.discard(mutation[1].id)
+            elif op == "update":
+                item = mutation[1]
+                item.name, item.rarity, item.desc, item.effect = mutation[3]
+            elif op == "clear":
+                self.items.clear()
+                self.id_pool = IdPool()
+            elif op == "restore":
+                self.items.extend(mutation[1])
+                for item in mutation[1]:
+                    if item.id is not None:
+                        self.id_pool.add(item.id)
+
+        self.write_queue.put(mutations)
+        if record:
+            self.undo_journal.record(mutations)
+        self.idle_timer.start(self.IDLE_MAINTENANCE_MS)
+
+        self.item_filter.reset(self.items)
+        self.filter_items()
+        self.update_item_of_the_day()
+
+    def undo_last_action(self):
+        # отменяет последнее действие без перезагрузки базы
+        mutations = self.undo_journal.undo()
+        if mutations is None:
+            self.statusBar().showMessage("Нечего отменять")
+            return
+        self.apply_mutations(mutations, record=False)
+        self.statusBar().showMessage("Действие отменено")
+
+    def redo_last_action(self):
+        # повторяет отмененное действие
+        mutations = self.undo_journal.redo()
+        if mutations is None:
+            self.statusBar().showMessage("Нечего повторять")
+            return
+        self.apply_mutations(mutations, record=False)
+        self.statusBar().showMessage("Действие повторено")
 
 
     def clear_items(self):
@@ -581,27 +1918,17 @@ class ItempediaApp(QMainWindow):
         reply = QMessageBox.question(
             self,
             "Подтверждение очистки",
-            "Вы уверены, что хотите удалить все предметы? Это действие нельзя отменить.",
+            "Вы уверены, что хотите удалить все предметы? Отменить можно через Правка → Отменить.",
             QMessageBox.StandardButton.Yes | QMessageBox.StandardButton.No,
             QMessageBox.StandardButton.No
         )
 
         if reply == QMessageBox.StandardButton.Yes:
-            # очищаем базу данных
-            self.db_manager.clear_all_items()
-
-            # очищаем списки предметов
-            self.items.clear()
-            self.filtered_items.clear()
-
-            # очищаем таблицу
-            self.items_table.setRowCount(0)
+            # список сохраняется в журнале отмены, база очищается в фоне
+            self.apply_mutations([("clear", list(self.items))])
 
             # обновляем статус бар
-            self.statusBar().showMessage("Все предметы удалены")
-
-            # обновляем предмет дня
-            self.update_item_of_the_day()
+            self.statusBar().showMessage("Все предметы удалены (Ctrl+Z - отменить)")
 
     def create_menu(self):
         # создает меню приложения
@@ -621,29 +1948,280 @@ class ItempediaApp(QMainWindow):
         exit_action = file_menu.addAction('Выход')
         exit_action.triggered.connect(self.close)
 
+        # меню сервис
+        service_menu = menubar.addMenu('Сервис')
+
+        maintenance_action = service_menu.addAction('Обслуживание базы данных')
+        maintenance_action.triggered.connect(self.run_full_maintenance)
+
+        compact_action = service_menu.addAction('Полное сжатие базы (VACUUM)')
+        compact_action.triggered.connect(lambda: self.start_maintenance(["vacuum", "optimize"]))
+
+        page_size_action = service_menu.addAction('Сжатие с другим размером страницы...')
+        page_size_action.triggered.connect(self.compact_with_page_size)
+
+        # меню правка
+        edit_menu = menubar.addMenu('Правка')
+
+        undo_action = edit_menu.addAction('Отменить')
+        undo_action.setShortcut(QKeySequence.StandardKey.Undo)
+        undo_action.triggered.connect(self.undo_last_action)
+
+        redo_action = edit_menu.addAction('Повторить')
+        redo_action.setShortcut(QKeySequence.StandardKey.Redo)
+        redo_action.triggered.connect(self.redo_last_action)
+
+    def mark_startup(self, stage):
+        # запоминает время этапа запуска от старта приложения, мс
+        self.startup_timings.setdefault(stage, (time.perf_counter() - self.startup_started) * 1000)
+
+    def paintEvent(self, event):
+        super().paintEvent(event)
+        self.mark_startup("first_paint")
+
+    def set_loading(self, loading):
+        # пока каталог загружается, действия с предметами недоступны
+        self.centralWidget().setEnabled(not loading)
+        self.menuBar().setEnabled(not loading)
+        if loading:
+            self.statusBar().showMessage("Загрузка предметов...")
+
     def load_items(self):
-        # загружает предметы из базы данных
-        try:
-            # загружаем из базы данных
-            self.items = self.db_manager.get_all_items()
+        # загружает предметы из базы в фоновом потоке, результат приходит в on_items_loaded
+        self.loader_thread = ItemLoaderThread(self.db_manager, self.create_demo_data(), self)
+        self.loader_thread.loaded.connect(self.on_items_loaded)
+        self.loader_thread.failed.connect(self.on_items_load_failed)
+        self.loader_thread.start()
+
+    def on_items_loaded(self, items, seq):
+        # показывает загруженный каталог, остальная работа запуска - следующим шагом
+        self.last_sync_seq = seq
+        self.items = items
+        self.id_pool = IdPool(item.id for item in self.items)
+        self.item_filter.reset(self.items)
+        self.filtered_items = ItemView(self.items)
+        self.update_items_table()
+        self.set_loading(False)
+        self.mark_startup("items_loaded")
+        self.statusBar().showMessage(
+            f"Загружено предметов: {len(self.items)} "
+            f"(запуск: {self.startup_timings['items_loaded']:.0f} мс)")
+        QTimer.singleShot(0, self.finish_startup)
+
+    def on_items_load_failed(self, message):
+        self.set_loading(False)
+        self.statusBar().showMessage("Готово")
+        QMessageBox.critical(self, "Ошибка", f"Не удалось загрузить предметы: {message}")
+        self.finish_startup()
 
-            # если база пустая, создаем демо данные
-            if not self.items:
-                self.create_demo_data()
-                # сохраняем демо данные в базу
-                for item in self.items:
-                    self.db_manager.add_item(item)
+    def finish_startup(self):
+        # отложенные этапы запуска: сообщения миграций, предмет дня и наблюдение за базой
+        for note in self.db_manager.migration_notes:
+            QMessageBox.information(self, "Обновление базы данных", note)
+        self.update_item_of_the_day()
+        self.db_manager.has_external_changes()  # запоминаем data_version после демо данных
+        self.sync_timer.start(1000)
+        self.mark_startup("ready")
+
+    def sync_external_changes(self):
+        # подтягивает только измененные строки, если базу поменял другой процесс
+        errors = self.write_queue.take_errors()
+        if errors:
+            self.report_write_errors(errors)
+
+        retry_error = self.write_queue.get_retry_error()
+        if retry_error is not None:
+            self.statusBar().showMessage(f"База занята, изменения будут записаны позже ({retry_error})")
+
+        # пока наши изменения не записаны, журнал базы отстает от памяти
+        if self.write_queue.has_pending():
+            return
+        if self.reload_needed:
+            self.reload_items()
+            return
 
-            self.filtered_items = self.items.copy()
-            self.update_items_table()
-            self.statusBar().showMessage(f"Загружено предметов: {len(self.items)}")
+        try:
+            if not self.db_manager.has_external_changes():
+                return
+            last_seq, changed_items, deleted_ids = self.db_manager.get_changes_since(self.last_sync_seq)
+        except sqlite3.Error:
+            return  # база занята, изменение остается замеченным до следующего тика
+        if last_seq == self.last_sync_seq:
+            self.db_manager.mark_synced()
+            return
+        if changed_items is None:
+            # другой процесс очистил каталог, построчных изменений в журнале нет
+            self.reload_items()
+            self.statusBar().showMessage("Каталог был очищен другим процессом, предметы перезагружены")
+            return
+        self.last_sync_seq = last_seq
+
+        # свои записи тоже попадают в журнал (пишет другое соединение), их память уже отражает:
+        # пересборка таблицы - только если какая-то строка действительно отличается
+        items_by_id = {item.id: item for item in self.items if item.id is not None}
+        deleted_ids = {item_id for item_id in deleted_ids if item_id in items_by_id}
+        if deleted_ids:
+            self.items[:] = [item for item in self.items if item.id not in deleted_ids]
+            for item_id in deleted_ids:
+                self.id_pool.discard(item_id)
+
+        updated = 0
+        new_ids = False
+        for changed in changed_items:
+            # в том числе наши новые строки: id им выдается только при записи
+            new_ids = self.id_pool.add(changed.id) or new_ids
+            item = items_by_id.get(changed.id)
+            if item is None:
+                self.items.append(changed)
+                updated += 1
+            elif item.get_values() != changed.get_values():
+                item.name, item.rarity, item.desc, item.effect = changed.get_values()
+                updated += 1
+
+        self.db_manager.mark_synced()
+
+        if updated or deleted_ids:
+            self.item_filter.reset(self.items)
+            self.filter_items()
+            self.update_item_of_the_day()
+            self.statusBar().showMessage(f"Синхронизировано изменений: {updated + len(deleted_ids)}")
+        elif new_ids:
+            self.update_item_of_the_day()  # набор для выбора изменился, таблица - нет
 
-        except Exception as e:
-            QMessageBox.critical(self, "Ошибка", f"Не удалось загрузить предметы: {str(e)}")
+        try:
+            if not self.db_manager.release_changes(last_seq):
+                # регистрация читателя истекла, журнал могли обрезать без нас
+                self.reload_items()
+        except sqlite3.Error:
+            pass  # журнал обрежется при следующей синхронизации
+
+    def report_write_errors(self, errors):
+        # база отвергла часть изменений (нарушение ограничений), в памяти они уже есть:
+        # предупреждаем пользователя, затем каталог перечитывается из базы
+        items = []
+        lines = []
+        for (op, target, *_), error in errors:
+            items.extend(target if isinstance(target, list) else [target])
+            name = target.name if isinstance(target, Item) else f"{len(target)} предметов"
+            lines.append(f"{op}: {name} ({error})")
+        self.undo_journal.discard(items)
+        self.reload_needed = True
+
+        self.sync_timer.stop()  # пока открыт диалог, тики не должны перезагружать каталог
+        QMessageBox.warning(
+            self, "Ошибка сохранения",
+            f"База данных отклонила изменений: {len(errors)}\n" + "\n".join(lines[:10]) +
+            "\n\nКаталог будет перечитан из базы, эти изменения отменены.")
+        self.sync_timer.start(1000)
+
+    def start_maintenance(self, tasks, quiet=False, page_size=None):
+        # запускает обслуживание базы в фоновом потоке
+        if self.maintenance_thread is not None and self.maintenance_thread.isRunning():
+            if not quiet:
+                self.statusBar().showMessage("Обслуживание базы уже выполняется")
+            return
 
-    def create_demo_data(self):
-        # создает демонстрационные данные
-        demo_items = [
+        # до конца обслуживания фоновая запись на паузе, иначе она упрется в эксклюзивную
+        # блокировку VACUUM; накопленное записывает сам поток обслуживания
+        self.write_queue.pause()
+        self.maintenance_thread = MaintenanceThread(self.db_manager, tasks, page_size, self.write_queue, self)
+        self.maintenance_thread.finished.connect(self.write_queue.resume)
+        if quiet:
+            self.maintenance_thread.report_ready.connect(
+                lambda report: self.statusBar().showMessage(
+                    f"База обслужена: {report['after']['file_size'] / 1024:.0f} КБ"))
+        else:
+            self.maintenance_thread.report_ready.connect(
+                lambda report: QMessageBox.information(
+                    self, "Обслуживание базы", StorageMaintenance.format_report(report)))
+        self.maintenance_thread.failed.connect(
+            lambda message: self.statusBar().showMessage(f"Ошибка обслуживания базы: {message}"))
+        self.maintenance_thread.start()
+        if not quiet:
+            self.statusBar().showMessage("Обслуживание базы запущено в фоне...")
+
+    def compact_with_page_size(self):
+        # полный VACUUM с выбранным размером страницы (крупные страницы - меньше чтений
+        # при полном просмотре каталога, мелкие - меньше записи при правке одной строки)
+        current = StorageMaintenance(self.db_manager).get_stats()["page_size"]
+        sizes = [str(size) for size in DatabaseManager.PAGE_SIZES]
+        size, ok = QInputDialog.getItem(
+            self, "Размер страницы", f"Размер страницы базы, байт (сейчас {current}):",
+            sizes, sizes.index(str(current)) if str(current) in sizes else 0, False
+        )
+        if ok:
+            self.start_maintenance(["vacuum", "optimize"], page_size=int(size))
+
+    def run_full_maintenance(self):
+        # включение инкрементального вакуума, возврат свободного места, статистика, проверка
+        self.start_maintenance(["enable_incremental_vacuum", "incremental_vacuum",
+                                "analyze", "integrity_check"])
+
+    def run_idle_maintenance(self):
+        # дешевое обслуживание, пока пользователь ничего не делает; если база занята
+        # и изменения ждут повтора, обслуживание откладывается до следующего простоя
+        if self.write_queue.get_retry_error() is not None:
+            self.idle_timer.start(self.IDLE_MAINTENANCE_MS)
+            return
+        self.start_maintenance(["incremental_vacuum", "optimize"], quiet=True)
+
+    def reload_items(self):
+        # полностью перечитывает предметы из базы, False - база занята, перезагрузка отложена
+        # объекты с тем же id сохраняются, поэтому журнал отмены остается рабочим
+        try:
+            if not self.write_queue.flush():
+                raise sqlite3.OperationalError(self.write_queue.get_retry_error())
+            self.last_sync_seq = self.db_manager.register_reader()
+            loaded = self.db_manager.get_all_items()
+        except sqlite3.Error as e:
+            self.reload_needed = True
+            self.statusBar().showMessage(f"База занята, перезагрузка отложена ({e})")
+            return False
+        self.db_manager.mark_synced()
+        self.reload_needed = False
+
+        current = {item.id: item for item in self.items if item.id is not None}
+        self.items = []
+        for item in loaded:
+            existing = current.get(item.id)
+            if existing is not None:
+                existing.name, existing.rarity, existing.desc, existing.effect = item.get_values()
+                item = existing
+            self.items.append(item)
+        self.id_pool = IdPool(item.id for item in self.items)
+        self.item_filter.reset(self.items)
+        self.filter_items()
+        self.update_item_of_the_day()
+        return True
+
+    def closeEvent(self, event):
+        # записываем все отложенные изменения и закрываем соединение наблюдения за базой
+        self.sync_timer.stop()
+        if self.loader_thread is not None:
+            self.loader_thread.wait()
+        if self.maintenance_thread is not None:
+            self.maintenance_thread.wait()
+        self.write_queue.resume()  # сигнал finished мог не успеть дойти
+        # база может быть занята другим процессом: без согласия пользователя изменения не теряем
+        self.write_queue.close()
+        while self.write_queue.has_pending():
+            reply = QMessageBox.question(
+                self, "Несохраненные изменения",
+                f"Не удалось записать изменения в базу ({self.write_queue.get_retry_error()}).\n"
+                "Повторить попытку? При отказе изменения будут потеряны.",
+                QMessageBox.StandardButton.Retry | QMessageBox.StandardButton.Discard,
+                QMessageBox.StandardButton.Retry
+            )
+            if reply != QMessageBox.StandardButton.Retry:
+                break
+            self.write_queue.flush()
+        self.db_manager.close()
+        super().closeEvent(event)
+
+    @staticmethod
+    def create_demo_data():
+        # возвращает демонстрационные данные для пустой базы
+        return [
             Item("Шприц солдата", "Обычный", "Увеличивает скорость атаки", "+15% скорость атаки"),
             Item("Плюшевый мишка", "Обычный", "Дает шанс избежать урона", "15% шанс блокировать урон"),
             Item("Укулеле", "Необычный", "Вызывает электрические разряды между врагами", "25% шанс ударить молнией"),
@@ -663,8 +2241,6 @@ class ItempediaApp(QMainWindow):
             Item("Бессмертие", "Легендарный", "Воскрешение после смерти", "Воскрешение с 50% здоровья")
         ]
 
-        self.items.extend(demo_items)
-
     def update_items_table(self):
         # обновляет таблицу предметов
         self.items_table.setRowCount(len(self.filtered_items))
@@ -696,12 +2272,8 @@ class ItempediaApp(QMainWindow):
         search_text = self.search_edit.text().lower()
         rarity_filter = self.rarity_filter.currentText()
 
-        self.filtered_items = [
-            item for item in self.items
-            if
-            (search_text in item.name.lower() or search_text in item.desc.lower() or search_text in item.effect.lower())
-            and (rarity_filter == "Все редкости" or item.rarity == rarity_filter)
-        ]
+        # кэшированный массив индексов не копируется: ItemView.sort создает новый
+        self.filtered_items = ItemView(self.items, self.item_filter.filter(search_text, rarity_filter))
 
         self.sort_items()
         self.statusBar().showMessage(f"Найдено предметов: {len(self.filtered_items)}")
@@ -719,7 +2291,7 @@ class ItempediaApp(QMainWindow):
 
     def add_new_item(self):
         # открывает диалог добавления нового предмета
-        dialog = ItemDialog(self)
+        dialog = self.get_item_dialog()
         if dialog.exec():
             item_data = dialog.get_item_data()
 
@@ -736,13 +2308,12 @@ class ItempediaApp(QMainWindow):
                 item_data['effect']
             )
 
-            # добавляем в базу данных
-            self.db_manager.add_item(new_item)
-
-            # добавляем в локальный список
-            self.items.append(new_item)
+            if self.find_item(new_item.name, new_item.rarity):
+                QMessageBox.warning(self, "Ошибка", "Предмет с таким названием и редкостью уже существует!")
+                return
 
-            self.filter_items()
+            # добавляем в локальный список, в базу данных - в фоне
+            self.apply_mutations([("add", new_item)])
             self.statusBar().showMessage(f"Добавлен предмет: {new_item.name}")
 
     def show_selected_item_info(self):
@@ -750,8 +2321,22 @@ class ItempediaApp(QMainWindow):
         current_row = self.items_table.currentRow()
         if current_row >= 0 and current_row < len(self.filtered_items):
             item = self.filtered_items[current_row]
-            dialog = ItemDetailsDialog(item, self)
-            dialog.exec()
+            self.get_details_dialog(item).exec()
+
+    def get_item_dialog(self, item=None):
+        # диалог добавления/редактирования строится один раз, дальше только перезаполняется
+        if self.item_dialog is None:
+            self.item_dialog = ItemDialog(self, item)
+        else:
+            self.item_dialog.set_item(item)
+        return self.item_dialog
+
+    def get_details_dialog(self, item, title=None):
+        # то же для диалога деталей предмета
+        if self.details_dialog is None:
+            self.details_dialog = ItemDetailsDialog(item, self)
+        self.details_dialog.set_item(item, title)
+        return self.details_dialog
 
     def random_loot(self):
         # открывает диалог генерации случайного лута
@@ -763,20 +2348,17 @@ class ItempediaApp(QMainWindow):
         dialog.exec()
 
     def update_item_of_the_day(self):
-        # обновляет предмет дня
-        if self.items:
-            # используем текущую дату как сид(seed)
-            today = datetime.now().date()
-            random.seed(today.toordinal())
-            self.item_of_the_day = random.choice(self.items)
-            random.seed()  # сбрасываем сид
+        # обновляет предмет дня; выбор по отсортированным id, как в api-сервере
+        # (порядок self.items меняется: отмена удаления и синхронизация добавляют в конец)
+        day_id = self.id_pool.pick(datetime.now().date())
+        if self.item_of_the_day is None or self.item_of_the_day.id != day_id:
+            # поиск по списку - только когда выбранный id сменился
+            self.item_of_the_day = next((item for item in self.items if item.id == day_id), None)
 
     def show_item_of_the_day(self):
         # показывает предмет дня
         if self.item_of_the_day:
-            dialog = ItemDetailsDialog(self.item_of_the_day, self)
-            dialog.setWindowTitle(f"📅 Предмет дня: {self.item_of_the_day.name}")
-            dialog.exec()
+            self.get_details_dialog(self.item_of_the_day, f"📅 Предмет дня: {self.item_of_the_day.name}").exec()
         else:
             QMessageBox.information(self, "Информация", "Предмет дня не доступен!")
 
@@ -807,11 +2389,12 @@ class ItempediaApp(QMainWindow):
 
         if file_path:
             try:
+                if not self.write_queue.flush():
+                    raise sqlite3.OperationalError(f"база занята: {self.write_queue.get_retry_error()}")
                 imported_count = self.db_manager.import_from_csv(file_path)
 
                 # перезагружаем предметы из базы
-                self.items = self.db_manager.get_all_items()
-                self.filter_items()
+                self.reload_items()
 
                 self.statusBar().showMessage(f"Импортировано предметов: {imported_count}")
 
@@ -835,13 +2418,24 @@ class ItempediaApp(QMainWindow):
 
 def main():
     # главная функция приложения через которую запускается само приложениее
+    # "rain2pedia.py --server [параметры]" запускает json api вместо окна
+    if len(sys.argv) > 1 and sys.argv[1] == "--server":
+        import api_server
+        sys.exit(api_server.main(sys.argv[2:]))
+    # "rain2pedia.py --memory-report [размеры]" печатает отчет о памяти каталога
+    if len(sys.argv) > 1 and sys.argv[1] == "--memory-report":
+        import memory_report
+        sys.exit(memory_report.main(sys.argv[2:]))
+
+    started = time.perf_counter()
     app = QApplication(sys.argv)
     app.setApplicationName("Rain2pedia")
     app.setApplicationVersion("1.0")
 
     app.setStyle('Fusion')
 
-    window = ItempediaApp()
+    # окно показывается сразу, каталог догружается уже после первой отрисовки
+    window = ItempediaApp(started=started)
     window.show()
 
     sys.exit(app.exec())